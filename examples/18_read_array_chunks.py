@@ -0,0 +1,26 @@
+'''
+the following import is only necessary because eip.py is not in this directory
+'''
+import sys
+sys.path.append('..')
+
+
+'''
+Read a large array a chunk at a time
+
+IterRead hands out each chunk as soon as it is read,
+so the whole array never has to be in memory at once.
+In this case, we add up 200,000 elements of BigLog,
+reading 5000 at a time.
+'''
+from pylogix import PLC
+
+with PLC() as comm:
+    comm.IPAddress = '192.168.1.9'
+    total = 0
+    for ret in comm.IterRead('BigLog[0]', 200000, 5000):
+        if ret.Status != 'Success':
+            print(ret.TagName, ret.Status)
+            break
+        total += sum(ret.Value)
+    print(total)
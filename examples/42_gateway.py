@@ -0,0 +1,22 @@
+'''
+the following import is only necessary because eip is not in this directory
+'''
+import sys
+sys.path.append('..')
+
+'''
+Read from several controllers in one chassis through
+the same Ethernet module, over one connection.
+
+Each controller gets its own forward open, but they all
+share the module's socket and session.  Gateway.Read
+reads from all of them at the same time.
+'''
+from pylogix import Gateway
+
+with Gateway('192.168.1.9') as gateway:
+    plcs = dict((slot, gateway.PLC(slot)) for slot in range(1, 7))
+    results = gateway.Read(dict((plc, ['Count', 'Speed']) for plc in plcs.values()))
+    for slot, plc in plcs.items():
+        for r in results[plc]:
+            print(slot, r.TagName, r.Value, r.Status)
@@ -0,0 +1,29 @@
+'''
+the following import is only necessary because eip is not in this directory
+'''
+import sys
+sys.path.append('..')
+
+
+'''
+Reading a udt as a dict, without defining it by hand
+
+The UDT definitions come from the PLC when the tag list
+is retrieved.  Once UDTResults is set, reading a UDT
+returns a dict of its members instead of raw bytes.
+
+NOTE: You only need to call .Close() after you are done exchanging
+data with the PLC.  If you were going to read in a loop or read
+more tags, you wouldn't want to call .Close() every time.
+'''
+from pylogix import PLC
+
+comm = PLC()
+comm.IPAddress = '192.168.2.241'
+comm.GetTagList()
+comm.UDTResults = True
+ret = comm.Read('Program:MainProgram.NestedUDT')
+# ret.Value is now in the form of {'b_Bool1': True, 'b_Bool2': False, 'b_Basic': {...}, 'b_DINT': 1, ...}
+print(ret.Value)
+
+comm.Close()
@@ -0,0 +1,31 @@
+'''
+the following import is only necessary because eip is not in this directory
+'''
+import sys
+sys.path.append('..')
+
+'''
+Read from several PLC's at the same time using asyncio.
+
+Each AsyncPLC has its own connection, but they all share
+the same event loop, so while one is waiting on its PLC
+to reply, the others can keep working.  This only
+requires one thread, no matter how many PLC's there are.
+'''
+import asyncio
+from pylogix import AsyncPLC
+
+
+async def poll(ip):
+    async with AsyncPLC(ip) as comm:
+        for i in range(10):
+            ret = await comm.Read('CurrentScreen')
+            print(ip, ret.Value, ret.Status)
+            await asyncio.sleep(1)
+
+
+async def main():
+    ips = ['192.168.1.9', '192.168.1.10', '192.168.1.11']
+    await asyncio.gather(*[poll(ip) for ip in ips])
+
+asyncio.run(main())
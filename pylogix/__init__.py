@@ -1,4 +1,6 @@
 from .eip import PLC
+from .lgx_async import AsyncPLC
+from .lgx_gateway import Gateway
 from .udt import *
 __version_info__ = (0, 8, 6)
 __version__ = '.'.join(str(x) for x in __version_info__)
@@ -22,13 +22,18 @@ import re
 import sys
 import time
 
+from . import lgx_cache
+from .lgx_array import pack_bits, unpack_array, unpack_bits, unpack_records
 from .lgx_comm import Connection
 from .lgx_device import Device
-from .lgx_response import Response
+from .lgx_group import TagGroup
+from .lgx_packet import multi_service_request, partial_read_request, read_request
+from .lgx_response import Response, ResponseColumns
 from .lgx_tag import Tag, UDT
+from .udt import from_template
 from datetime import datetime, timedelta
 from random import randrange
-from struct import pack, unpack_from
+from struct import calcsize, pack, unpack_from, Struct
 
 class PLC(object):
 
@@ -41,13 +46,24 @@ class PLC(object):
         self.SocketTimeout = timeout
         self.Micro800 = Micro800
         self.Route = None
+        self.PipelineDepth = 1
+        self.Connections = 1
+        self.ArrayResults = False
+        self.PackedBits = False
+        self.InstanceAddressing = False
+        self.TagListCache = None
+        self.UDTResults = False
+        self.ColumnResults = False
 
         self.conn = Connection(self)
 
-        self.Offset = 0
         self.UDT = {}
         self.UDTByName = {}
+        self._codecs = {}
+        self._handles = {}
+        self._structs = {}
         self.KnownTags = {}
+        self.InstanceIDs = {}
         self.TagList = []
         self.ProgramNames = []
         self.StringID = 0x0fce
@@ -96,20 +112,37 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        if isinstance(tag, (list, tuple)):
-            if len(tag) == 1:
-                return [self._read_tag(tag[0], count, datatype)]
-            if datatype:
-                raise TypeError('Datatype should be set to None when reading lists')
-            if self.Micro800 == True:
-                if isinstance(tag[0], (list, tuple)):
-                    return [self._read_tag(*t) for t in tag]
-                else:
-                    return [self._read_tag(t, count, datatype) for t in tag]
-            else:
-                return self._batch_read(tag)
-        else:
-            return self._read_tag(tag, count, datatype)
+        return self.conn.run(self._read(tag, count, datatype))
+
+    def CompileRead(self, tags):
+        """
+        Prepare a list of tags that will be read repeatedly.  The
+        requests are built once, pass the group to Read() to read
+        all of the tags.
+
+        returns TagGroup
+        """
+        return self.conn.run(self._compile_read(TagGroup(tags)))
+
+    def ReadInto(self, tag, buffer):
+        """
+        Read a tag, or a compiled tag group, straight into a buffer
+        that already exists instead of creating new values and
+        Response's, for reading the same tags over and over
+
+        returns the status
+        """
+        return self.conn.run(self._read_into(tag, buffer))
+
+    def IterRead(self, tag, count, chunk=None):
+        """
+        Read a large array a chunk at a time, each chunk is handed
+        out as soon as it is read, so the whole array is never held
+        in memory.  By default a chunk is what fits in one reply
+
+        returns a generator of Response class (.TagName, .Value, .Status)
+        """
+        return self.conn.stream(self._iter_read(tag, count, chunk))
 
     def Write(self, tag, value=None, datatype=None):
         """
@@ -118,16 +151,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        if isinstance(tag, (list, tuple)):
-            if len(tag) == 1:
-                return [self._write_tag(*tag[0])]
-            else:
-                return self._batch_write(tag)
-        else:
-            if value == None:
-                raise TypeError('You must provide a value to write')
-            else:
-                return self._write_tag(tag, value, datatype)
+        return self.conn.run(self._write(tag, value, datatype))
 
     def GetPLCTime(self, raw=False):
         """
@@ -135,7 +159,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        return self._getPLCTime(raw)
+        return self.conn.run(self._getPLCTime(raw))
 
 
     def GetAttributeSingle(self, class_id: int, instance_id: int, attribute_id):
@@ -153,7 +177,7 @@ class PLC(object):
         data = pack('<HH',
                      AttributeCount,
                      attribute_id)
-        return self._getCustomMsg(service_id, class_id, instance_id, data)
+        return self.conn.run(self._getCustomMsg(service_id, class_id, instance_id, data))
 
     def SetPLCTime(self):
         """
@@ -161,7 +185,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        return self._setPLCTime()
+        return self.conn.run(self._setPLCTime())
 
     def GetTagList(self, allTags=True):
         """
@@ -172,13 +196,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        self.UDT = {}
-        self.KnownTags = {}
-        self.TagList = []
-        self.ProgramNames = []
-        tag_list = self._getTagList(allTags)
-        updated_list = self._getUDT(tag_list.Value) if tag_list.Value else None
-        return Response(None, updated_list, tag_list.Status)
+        return self.conn.run(self._get_tag_list(allTags))
 
     def GetProgramTagList(self, programName):
         """
@@ -187,24 +205,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        conn = self.conn.connect()
-        if not conn[0]:
-            return Response(programName, None, conn[1])
-
-        # If ProgramNames is empty then _getTagList hasn't been called
-        if not self.ProgramNames:
-            self._getTagList(False)
-
-        # Get single program tags if progragName exists
-        if programName in self.ProgramNames:
-            program_tags = self._getProgramTagList(programName)
-            # Getting status from program_tags Response object
-            # _getUDT returns a list of tags might need rework in the future
-            status = program_tags.Status
-            program_tags = self._getUDT(program_tags.Value)
-            return Response(None, program_tags, status)
-        else:
-            return Response(programName, None, 'Program not found, please check name!')
+        return self.conn.run(self._get_program_tag_list(programName))
 
     def GetProgramsList(self):
         """
@@ -214,21 +215,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-
-        conn = self.conn.connect()
-        if not conn[0]:
-            return Response(None, None, conn[1])
-
-        tags = ''
-        if not self.ProgramNames:
-            tags = self._getTagList(False)
-        if tags:
-            status = tags.Status
-        if self.ProgramNames:
-            status = 0
-        else:
-            status = "Unable to retrieve programs list"
-        return Response(None, self.ProgramNames, status)
+        return self.conn.run(self._get_programs_list())
 
     def Discover(self):
         """
@@ -245,7 +232,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        return self._getModuleProperties(slot)
+        return self.conn.run(self._getModuleProperties(slot))
 
     def GetDeviceProperties(self):
         """
@@ -254,7 +241,7 @@ class PLC(object):
 
         returns Response class (.TagName, .Value, .Status)
         """
-        return self._getDeviceProperties()
+        return self.conn.run(self._getDeviceProperties())
 
     def Close(self):
         """
@@ -262,7 +249,186 @@ class PLC(object):
         """
         return self.conn.close()
 
-    def _batch_read(self, tags):
+    def _read(self, tag, count, datatype):
+        """
+        Decide which type of read to perform based on the arguments
+        """
+        if isinstance(tag, TagGroup):
+            if self.ColumnResults and not self.Micro800:
+                result = yield from self._read_columns(tag)
+            else:
+                result = yield from self._read_group(tag)
+            return result
+        elif isinstance(tag, (list, tuple)):
+            if self.ColumnResults and not self.Micro800:
+                if datatype:
+                    raise TypeError('Datatype should be set to None when reading lists')
+                result = yield from self._read_columns(TagGroup(tag))
+                return result
+            if len(tag) == 1:
+                if isinstance(tag[0], (list, tuple)):
+                    result = yield from self._read_tag(*read_args(tag[0]))
+                else:
+                    result = yield from self._read_tag(*read_args((tag[0], count, datatype)))
+                return [result]
+            if datatype:
+                raise TypeError('Datatype should be set to None when reading lists')
+            if self.Micro800 == True:
+                result = []
+                for t in tag:
+                    if isinstance(tag[0], (list, tuple)):
+                        response = yield from self._read_tag(*read_args(t))
+                    else:
+                        response = yield from self._read_tag(*read_args((t, count, datatype)))
+                    result.append(response)
+                return result
+            else:
+                result = yield from self._batch_read(tag)
+                return result
+        else:
+            result = yield from self._read_tag(*read_args((tag, count, datatype)))
+            return result
+
+    def _write(self, tag, value, datatype):
+        """
+        Decide which type of write to perform based on the arguments
+        """
+        if isinstance(tag, (list, tuple)):
+            if len(tag) == 1:
+                result = yield from self._write_tag(*tag[0])
+                return [result]
+            else:
+                result = yield from self._batch_write(tag)
+                return result
+        else:
+            if value == None:
+                raise TypeError('You must provide a value to write')
+            else:
+                result = yield from self._write_tag(tag, value, datatype)
+                return result
+
+    def _get_tag_list(self, allTags):
+        """
+        Retrieve the tag list, then the UDT definitions
+        """
+        self.UDT = {}
+        self._codecs = {}
+        self._handles = {}
+        self._structs = {}
+        self.KnownTags = {}
+        self.InstanceIDs = {}
+        self.TagList = []
+        self.ProgramNames = []
+
+        # the signature is read before the tag list, so a change
+        # made while it is being uploaded is caught next time
+        cache = None
+        if self.TagListCache:
+            key, signature = yield from self._get_controller_signature()
+            if signature:
+                cache = lgx_cache.cache_path(self.TagListCache, key, allTags)
+                cached = lgx_cache.load(cache, signature)
+                if cached:
+                    tags, self.UDT, self.ProgramNames = cached
+                    self.UDTByName = dict((u.Name, u) for u in self.UDT.values())
+                    self.TagList = tags
+                    self._store_instance_ids(tags)
+                    self._store_struct_sizes(tags)
+                    return Response(None, tags, 0)
+
+        tag_list = yield from self._getTagList(allTags)
+        if tag_list.Value:
+            self._store_instance_ids(tag_list.Value)
+            updated_list = yield from self._getUDT(tag_list.Value)
+            if cache:
+                lgx_cache.save(cache, signature, updated_list, self.UDT, self.ProgramNames)
+        else:
+            updated_list = None
+        return Response(None, updated_list, tag_list.Status)
+
+    def _get_controller_signature(self):
+        """
+        Identify the controller and the state of its tag list with a
+        single request.  The identity (vendor, product code and serial
+        number) names the cache, the change counters of class 0xAC
+        change whenever tags or programs are edited or downloaded.
+        Returns the key and signature, None when they can't be read
+        """
+        conn = yield ('connect',)
+        if not conn[0]:
+            return None, None
+
+        identity = pack('<6B', 0x01, 0x02, 0x20, 0x01, 0x24, 0x01)
+        changes = pack('<6B6H', 0x03, 0x02, 0x20, 0xAC, 0x24, 0x01,
+                       0x05, 0x01, 0x02, 0x03, 0x04, 0x0A)
+        status, ret_data = yield ('send', multi_service_request([identity, changes]))
+        if status != 0 or not ret_data:
+            return None, None
+
+        stripped = ret_data[50:]
+        offsets = unpack_from('<2H', stripped, 2)
+        if stripped[offsets[0]+2] or stripped[offsets[1]+2]:
+            return None, None
+
+        vendor, device_type, product_code = unpack_from('<3H', stripped, offsets[0]+4)
+        serial = unpack_from('<I', stripped, offsets[0]+14)[0]
+        key = '{:04x}-{:04x}-{:08x}'.format(vendor, product_code, serial)
+        signature = bytes(stripped[offsets[1]+4:]).hex()
+        return key, signature
+
+    def _get_program_tag_list(self, programName):
+        """
+        Retrieve the tag list of a single program
+        """
+        conn = yield ('connect',)
+        if not conn[0]:
+            return Response(programName, None, conn[1])
+
+        # If ProgramNames is empty then _getTagList hasn't been called
+        if not self.ProgramNames:
+            yield from self._getTagList(False)
+
+        # Get single program tags if progragName exists
+        if programName in self.ProgramNames:
+            program_tags = yield from self._getProgramTagList(programName)
+            # Getting status from program_tags Response object
+            # _getUDT returns a list of tags might need rework in the future
+            status = program_tags.Status
+            self._store_instance_ids(program_tags.Value)
+            program_tags = yield from self._getUDT(program_tags.Value)
+            return Response(None, program_tags, status)
+        else:
+            return Response(programName, None, 'Program not found, please check name!')
+
+    def _store_instance_ids(self, tags):
+        """
+        Keep the symbol instance of each tag for instance addressing,
+        tag names aren't case sensitive
+        """
+        for tag in tags:
+            self.InstanceIDs[tag.TagName.lower()] = tag.InstanceID
+
+    def _get_programs_list(self):
+        """
+        Retrieve the program names, getting the tag list first
+        if it hasn't been retrieved yet
+        """
+        conn = yield ('connect',)
+        if not conn[0]:
+            return Response(None, None, conn[1])
+
+        tags = ''
+        if not self.ProgramNames:
+            tags = yield from self._getTagList(False)
+        if tags:
+            status = tags.Status
+        if self.ProgramNames:
+            status = 0
+        else:
+            status = "Unable to retrieve programs list"
+        return Response(None, self.ProgramNames, status)
+
+    def _batch_read(self, tags, coalesce=True):
         """
         Processes the multiple read request. Split into multiple requests and
         reassemble responses when needed
@@ -270,58 +436,541 @@ class PLC(object):
         if self.Micro800 == True:
             return Response(tags, None, 8)
 
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return [Response(t, None, conn[1]) for t in tags]
 
+        # members of the same struct are read along with the struct
+        if coalesce:
+            reads, owners = self._coalesce_reads(tags)
+        else:
+            reads, owners = list(tags), list(range(len(tags)))
+
         # get data types of unknown tags
-        self._get_unknown_types(tags)
+        yield from self._get_unknown_types(reads)
+
+        # elements close together in an array are read as a range
+        if coalesce:
+            reads, owners = self._coalesce_elements(reads, owners)
+
+        # split the tags up into as few multi-service requests as possible,
+        # anything too big for one is read on its own
+        plan, large = self._plan_multi_read(reads, False)
+        replies = yield ('send_many', [request for request, indexes in plan])
+
+        values = [None] * len(reads)
+        for (request, indexes), (status, ret_data) in zip(plan, replies):
+            packet = [reads[i] for i in indexes]
+            if ret_data:
+                raw = set(n for n, i in enumerate(indexes) if not isinstance(owners[i], int))
+                responses = self._parse_multi_read(packet, ret_data, raw)
+            else:
+                responses = [Response(read_args(t)[0], None, status) for t in packet]
+            for i, response in zip(indexes, responses):
+                values[i] = response
 
-        result = []
-        while len(result) < len(tags):
-            if len(result) == len(tags) - 1:
-                # single tag left over, can't use multi msg service
-                tag = tags[len(result):][0]
-                result.append(self._read_tag(tag, 1, None))
+        result, large, fallback = self._split_reads(len(tags), owners, values, large)
+        if fallback:
+            responses = yield from self._batch_read([tags[i] for i in fallback], False)
+            for i, response in zip(fallback, responses):
+                result[i] = response
+
+        yield from self._read_separately(tags, result, large)
+        return result
+
+    def _coalesce_reads(self, tags):
+        """
+        Find the members of the same struct in a list of tags, when
+        reading the whole struct once costs less than reading each
+        member: counting the bytes of the requests and replies, plus
+        what the controller spends on each service.  Returns what to
+        read and, for each read, the index of its tag or the handle of
+        the struct with the members to take out of it
+        """
+        if not self._structs:
+            return list(tags), list(range(len(tags)))
+
+        reads = []
+        owners = []
+        parents = {}
+        for i, tag in enumerate(tags):
+            tag_name, elements, data_type = read_args(tag)
+            location = self._member_location(tag_name) if elements == 1 else None
+            if location:
+                parent, handle, size, member = location
+                parents.setdefault((parent, handle, size), []).append((i, tag_name) + member)
+            else:
+                reads.append(tag)
+                owners.append(i)
+
+        # one service costs about as much as this many bytes
+        service_cost = 16
+        # what fits in the reply of a multi-service request
+        limit = self.ConnectionSize - 8
+        for (parent, handle, size), members in parents.items():
+            cost = len(self._build_ioi(parent, 0xa0)) + 16 + size + service_cost
+            member_cost = 0
+            for i, tag_name, offset, value_struct, bit in members:
+                member_cost += len(self._build_ioi(tag_name, 0xa0)) + 14 + value_struct.size + service_cost
+            if 10 + size <= limit and cost <= member_cost:
+                reads.append(parent)
+                owners.append((handle, members))
+            else:
+                for member in members:
+                    reads.append(tags[member[0]])
+                    owners.append(member[0])
+
+        return reads, owners
+
+    def _member_location(self, tag_name):
+        """
+        Where a member is in the struct it belongs to, from the UDT
+        definitions.  Returns the struct to read (a tag or an element
+        of an array of structs), its handle and size, and the member's
+        offset, Struct and bit.  None when the tag isn't the
+        member of a known struct, or is a struct itself
+        """
+        names = tag_name.split('.')
+        root = names.pop(0)
+        if root.lower().startswith('program:') and names:
+            root += '.' + names.pop(0)
+        tag, base_tag, index = parse_tag_name(root)
+        struct_tag = self._structs.get(base_tag)
+        if not names or struct_tag is None:
+            return None
+
+        # the element of an array of structs has to be the whole struct
+        dimensions = (len(index) if isinstance(index, list) else 1) if root.endswith(']') else 0
+        if dimensions != struct_tag.Array:
+            return None
+
+        udt = template = self.UDT[struct_tag.DataTypeValue]
+        # the value of a struct starts with its handle
+        offset = 2
+        fmt = bit = None
+        for name in names:
+            if template is None:
+                # only the bit of an integer can follow a member
+                if bit is None and name.isdigit() and fmt in ('<b', '<h', '<i', '<q', '<B', '<H', '<I', '<Q') \
+                        and int(name) < calcsize(fmt) * 8:
+                    bit = int(name)
+                    continue
+                return None
+
+            member, base, index = parse_tag_name(name)
+            field = template.FieldsByName.get(base)
+            if field is None or bool(field.Array) != name.endswith(']') or isinstance(index, list):
+                return None
+            offset += field.Meta
+            template = None
+
+            if field.Struct:
+                template = self.UDT.get(field.DataTypeValue)
+                if template is None or (field.Array and index >= field.Size):
+                    return None
+                offset += index * template.Size if field.Array else 0
+            elif field.SymbolType == 0xd3:
+                # BOOL arrays are made of DWORD's
+                if index >= field.Size * 32:
+                    return None
+                offset += index // 32 * 4
+                fmt, bit = '<I', index % 32
+            elif field.SymbolType == 0xc1:
+                # the bit of a BOOL member is where the size of an array would be
+                bit = unpack_from('<H', field.Bytes, 0)[0]
+                offset += bit // 8
+                fmt, bit = '<B', bit % 8
+            elif field.SymbolType in self.CIPTypes and field.SymbolType not in (0xa0, 0xda):
+                fmt = self.CIPTypes[field.SymbolType][2]
+                if field.Array:
+                    if index >= field.Size:
+                        return None
+                    offset += index * calcsize(fmt)
+            else:
+                return None
+
+        if template is not None:
+            return None
+        return root, udt.Handle, udt.Size, (offset, Struct(fmt), bit)
+
+    def _coalesce_elements(self, reads, owners):
+        """
+        Replace reads of single elements of the same array with reads
+        of ranges.  The next element joins a range when the elements in
+        between cost fewer bytes than a service of its own, as long as
+        the range fits in a reply.  The owner of a range is None, for
+        no handle, and the elements to take out of it
+        """
+        arrays = {}
+        coalesced_reads = []
+        coalesced_owners = []
+        for read, owner in zip(reads, owners):
+            location = self._element_location(read) if isinstance(owner, int) else None
+            if location:
+                base_tag, data_type, position, bit = location
+                arrays.setdefault((base_tag, data_type), []).append((position, owner, read, bit))
+            else:
+                coalesced_reads.append(read)
+                coalesced_owners.append(owner)
+
+        # one service costs about as much as this many bytes
+        service_cost = 16
+        # what fits in the reply of a multi-service request
+        limit = self.ConnectionSize - 8
+        for (base_tag, data_type), elements in arrays.items():
+            size = self.CIPTypes[data_type][0]
+            single = len(self._build_ioi(base_tag + '[0]', data_type)) + 14 + size + service_cost
+            elements.sort(key=lambda e: e[0])
+            ranges = [[elements[0]]]
+            for element in elements[1:]:
+                first, last = ranges[-1][0][0], ranges[-1][-1][0]
+                if (element[0] - last - 1) * size <= single and 10 + (element[0] - first + 1) * size <= limit:
+                    ranges[-1].append(element)
+                else:
+                    ranges.append([element])
+
+            value_struct = Struct(self.CIPTypes[data_type][2])
+            for elements in ranges:
+                start = elements[0][0]
+                count = elements[-1][0] - start + 1
+                if len(elements) == 1:
+                    coalesced_reads.append(elements[0][2])
+                    coalesced_owners.append(elements[0][1])
+                    continue
+                # BOOL arrays are read by the bit, in whole DWORD's
+                bits = 32 if data_type == 0xd3 else 1
+                coalesced_reads.append(('{}[{}]'.format(base_tag, start * bits), count * bits))
+                coalesced_owners.append((None, [(owner, read_args(read)[0], (position - start) * size, value_struct, bit)
+                                                for position, owner, read, bit in elements]))
+
+        return coalesced_reads, coalesced_owners
+
+    def _element_location(self, tag):
+        """
+        Where a single element is in its array, for arrays of atomic
+        types.  Returns the array, its data type, the position of the
+        element and the bit, None for anything else
+        """
+        tag_name, elements, data_type = read_args(tag)
+        name, bit = tag_name, None
+        if bit_of_word(tag_name):
+            name, bit = tag_name.rsplit('.', 1)
+            bit = int(bit)
+        if elements != 1 or not name.endswith(']'):
+            return None
+
+        name, base_tag, index = parse_tag_name(name)
+        data_type = self.KnownTags.get(base_tag, (None, 0))[0]
+        if isinstance(index, list) or data_type not in self.CIPTypes or data_type in (0x00, 0xa0, 0xc1, 0xda):
+            return None
+        if data_type == 0xd3:
+            if bit is not None:
+                return None
+            return base_tag, data_type, index // 32, index % 32
+        if bit is not None and (data_type in (0xca, 0xcb) or bit >= self.CIPTypes[data_type][0] * 8):
+            return None
+        return base_tag, data_type, index, bit
+
+    def _split_reads(self, count, owners, values, large):
+        """
+        Hand out the replies to the tags they were read for, taking
+        members out of their struct and elements out of their range.
+        Returns the responses, the tags to read on their own and the
+        members or elements that have to be read after all, when the
+        struct or range couldn't be read (or the struct has changed)
+        """
+        large = set(large)
+        result = [None] * count
+        separate = []
+        fallback = []
+        for i, (owner, response) in enumerate(zip(owners, values)):
+            if isinstance(owner, int):
+                result[owner] = response
+                if i in large:
+                    separate.append(owner)
+                continue
+
+            handle, members = owner
+            if response is None or response.Value is None or \
+                    (handle is not None and unpack_from('<H', response.Value, 0)[0] != handle):
+                fallback += [member[0] for member in members]
+                continue
+            for index, tag_name, offset, value_struct, bit in members:
+                value = value_struct.unpack_from(response.Value, offset)[0]
+                if bit is not None:
+                    value = bit_value(value, bit)
+                result[index] = Response(tag_name, value, 0)
+
+        return result, separate, fallback
+
+    def _read_separately(self, tags, result, large):
+        """
+        Read the tags that did not fit in a multi-service request, along
+        with any that came back as a partial transfer, one at a time so
+        that they can be read in fragments
+        """
+        partial = Response.get_error_code(6)
+        for i, response in enumerate(result):
+            if response is not None and response.Status == partial:
+                large.append(i)
+
+        for i in sorted(large):
+            result[i] = yield from self._read_tag(*read_args(tags[i]))
+
+    def _compile_read(self, group):
+        """
+        Build the multi-service requests for a tag group, along with
+        what is needed to decode each tag in the replies
+        """
+        if self.Micro800:
+            return group
+
+        conn = yield ('connect',)
+        if not conn[0]:
+            return group
+
+        # members of the same struct are read along with the struct
+        reads, owners = self._coalesce_reads(group.Tags)
+
+        # get data types of unknown tags, sizes and decoders depend on them
+        yield from self._get_unknown_types(reads)
+        reads, owners = self._coalesce_elements(reads, owners)
+
+        plan, large = self._plan_multi_read(reads, False)
+        group._requests = [request for request, indexes in plan]
+        group._indexes = [indexes for request, indexes in plan]
+        group._large = large
+        group._owners = owners
+        group._decoders = [[self._group_decoder(reads[i]) if isinstance(owners[i], int) else (reads[i], 0xa0, None, None)
+                            for i in indexes] for request, indexes in plan]
+        group._connection_size = self.ConnectionSize
+        return group
+
+    def _group_decoder(self, tag):
+        """
+        Work out how to decode the tag from a multi-service reply.
+        Returns the tag name, data type, unpack function and bit,
+        only the tag is known for types or counts that need parsing
+        """
+        tag_name, elements, data_type = read_args(tag)
+        if elements != 1:
+            return tag, None, None, None
+        tag = tag_name
+        tag_name, base_tag, index = parse_tag_name(tag)
+        data_type = self.KnownTags.get(base_tag, (None, 0))[0]
+
+        if data_type in (None, 0xa0, 0xda) or data_type not in self.CIPTypes:
+            return tag, None, None, None
+
+        bit = None
+        if bit_of_word(tag) or data_type == 0xd3:
+            bit = bit_of_word_index(tag)
+
+        return tag, data_type, Struct(self.CIPTypes[data_type][2]).unpack_from, bit
+
+    def _read_group(self, group):
+        """
+        Read a compiled tag group, compiling it first if needed
+        """
+        if self.Micro800:
+            return Response(group.Tags, None, 8)
+
+        conn = yield ('connect',)
+        if not conn[0]:
+            return [Response(t, None, conn[1]) for t in group.Tags]
+
+        if group._connection_size != self.ConnectionSize:
+            yield from self._compile_read(group)
+
+        values = [None] * len(group._owners)
+        replies = yield ('send_many', group._requests)
+        for indexes, decoders, (status, ret_data) in zip(group._indexes, group._decoders, replies):
+            if ret_data:
+                responses = self._parse_group_reply(decoders, ret_data)
             else:
-                result.extend(self._multi_read(tags[len(result):], False))
+                responses = [Response(read_args(d[0])[0], None, status) for d in decoders]
+            for i, response in zip(indexes, responses):
+                values[i] = response
 
+        result, large, fallback = self._split_reads(len(group.Tags), group._owners, values, group._large)
+        if fallback:
+            responses = yield from self._batch_read([group.Tags[i] for i in fallback], False)
+            for i, response in zip(fallback, responses):
+                result[i] = response
+
+        yield from self._read_separately(group.Tags, result, large)
         return result
 
+    def _parse_group_reply(self, decoders, data):
+        """
+        Decode a multi-service reply of a tag group.  Tags that
+        can't be unpacked directly are parsed the usual way
+        """
+        reply = []
+        for i, (tag, data_type, unpack, bit) in enumerate(decoders):
+            offset = 50 + unpack_from('<H', data, 52+(i*2))[0]
+            status = data[offset+2]
+            if unpack is None and data_type == 0xa0:
+                # a struct that members are taken out of, keep the bytes
+                end = 50 + unpack_from('<H', data, 54+(i*2))[0] if i + 1 < len(decoders) else len(data)
+                value = None if status or data[offset+3] else data[offset+6:end]
+                reply.append(Response(tag, value, status))
+            elif not status and not data[offset+3] and data[offset+4] == data_type:
+                value = unpack(data, offset+6)[0]
+                if bit is not None:
+                    value = bit_value(value, bit)
+                reply.append(Response(tag, value, status))
+            else:
+                if i + 1 < len(decoders):
+                    end = 50 + unpack_from('<H', data, 54+(i*2))[0]
+                else:
+                    end = len(data)
+                reply.append(self._parse_multi_value(tag, data[50:], offset-50, end-offset))
+
+        return reply
+
+    def _read_into(self, tag, buffer):
+        """
+        Read the elements of a tag that fill the buffer, copying each
+        reply (or fragment) into it as it arrives.  The values are
+        copied as the PLC sends them, little endian, so a buffer of the
+        same type gets the values and a bytearray the raw bytes
+        """
+        if isinstance(tag, TagGroup):
+            status = yield from self._read_group_into(tag, buffer)
+            return status
+
+        conn = yield ('connect',)
+        if not conn[0]:
+            return Response.get_error_code(conn[1])
+
+        tag, elements, data_type = read_args(tag)
+        tag_name, base_tag, index = parse_tag_name(tag)
+        resp = yield from self._initial_read(tag, base_tag, None)
+        if resp[2] != 0 and resp[2] != 6:
+            return Response.get_error_code(resp[2])
+
+        data_type, size = self.KnownTags[base_tag]
+        target = memoryview(buffer).cast('B')
+        count = target.nbytes // (size or self.CIPTypes[data_type][0])
+
+        ioi = self._build_ioi(tag, data_type)
+        # the data type (and struct handle) comes before the values
+        pad = 4 if data_type == 0xa0 else 2
+        status, ret_data = yield ('send', self._add_read_service(ioi, count))
+        offset = 0
+        while ret_data and (status == 0 or status == 6):
+            part = memoryview(ret_data)[50+pad:50+pad+target.nbytes-offset]
+            target[offset:offset+len(part)] = part
+            offset += len(part)
+            if status == 0:
+                break
+            status, ret_data = yield ('send', self._add_partial_read_service(ioi, count, offset))
+
+        return Response.get_error_code(status)
+
+    def _read_group_into(self, group, buffer, statuses=None):
+        """
+        Read a compiled tag group into a buffer with a value for each
+        tag, ex: a numpy array or array.array.  Only tags that can't be
+        unpacked directly are parsed the usual way.  Returns the status
+        of the first tag that failed, the others are still read.  If a
+        list of statuses is passed, the status of each tag that failed
+        is put in it too
+        """
+        def failed(indexes, code):
+            if statuses is not None:
+                error = Response.get_error_code(code)
+                for i in indexes:
+                    statuses[i] = error
+
+        if self.Micro800:
+            failed(range(len(group.Tags)), 8)
+            return Response.get_error_code(8)
+
+        conn = yield ('connect',)
+        if not conn[0]:
+            failed(range(len(group.Tags)), conn[1])
+            return Response.get_error_code(conn[1])
+
+        if group._connection_size != self.ConnectionSize:
+            yield from self._compile_read(group)
+
+        status = 0
+        again = list(group._large)
+        replies = yield ('send_many', group._requests)
+        for indexes, decoders, (reply_status, data) in zip(group._indexes, group._decoders, replies):
+            if not data:
+                failed([j for i in indexes for j in owner_indexes(group._owners[i])], reply_status)
+                status = status or reply_status
+                continue
+            for n, i in enumerate(indexes):
+                tag, data_type, unpack, bit = decoders[n]
+                owner = group._owners[i]
+                offset = 50 + unpack_from('<H', data, 52+(n*2))[0]
+                if data[offset+2] or data[offset+3]:
+                    if data[offset+2] == 6:
+                        again.append(i)
+                    else:
+                        failed(owner_indexes(owner), data[offset+2])
+                        status = status or data[offset+2]
+                elif not isinstance(owner, int):
+                    handle, members = owner
+                    if handle is not None and unpack_from('<H', data, offset+6)[0] != handle:
+                        again.append(i)
+                        continue
+                    for index, tag_name, member_offset, value_struct, bit in members:
+                        value = value_struct.unpack_from(data, offset+6+member_offset)[0]
+                        buffer[index] = value if bit is None else bit_value(value, bit)
+                elif unpack is not None and data[offset+4] == data_type:
+                    value = unpack(data, offset+6)[0]
+                    buffer[owner] = value if bit is None else bit_value(value, bit)
+                else:
+                    again.append(i)
+
+        # the rest are read and parsed the usual way
+        tags = []
+        for i in again:
+            tags += owner_indexes(group._owners[i])
+        if tags:
+            responses = yield from self._batch_read([group.Tags[i] for i in tags], False)
+            for i, response in zip(tags, responses):
+                if response.Value is None:
+                    failed([i], response.Status)
+                    status = status or response.Status
+                else:
+                    buffer[i] = response.Value
+
+        return Response.get_error_code(status)
+
+    def _read_columns(self, group):
+        """
+        Read a tag group into columns of values and statuses,
+        without a Response for each tag
+        """
+        values = [None] * len(group.Tags)
+        statuses = [Response.get_error_code(0)] * len(group.Tags)
+        yield from self._read_group_into(group, values, statuses)
+        return ResponseColumns([read_args(t)[0] for t in group.Tags], values, statuses)
+
     def _read_tag(self, tag_name, elements, data_type):
         """
         Processes the read request
         """
-        self.Offset = 0
-
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(tag_name, None, conn[1])
 
         tag, base_tag, index = parse_tag_name(tag_name)
-        resp = self._initial_read(tag, base_tag, data_type)
+        resp = yield from self._initial_read(tag, base_tag, data_type)
         if resp[2] != 0 and resp[2] != 6:
             return Response(tag_name, None, resp[2])
 
         data_type = self.KnownTags[base_tag][0]
-        bit_count = self.CIPTypes[data_type][0] * 8
 
         ioi = self._build_ioi(tag_name, data_type)
-        if data_type == 0xd3:
-            # bool array
-            words = get_word_count(index, elements, bit_count)
-            request = self._add_read_service(ioi, words)
-        elif bit_of_word(tag):
-            # bits of word
-            split_tag = tag_name.split('.')
-            bit_pos = split_tag[len(split_tag)-1]
-            bit_pos = int(bit_pos)
-
-            words = get_word_count(bit_pos, elements, bit_count)
-            request = self._add_read_service(ioi, words)
-        else:
-            # everything else
-            request = self._add_read_service(ioi, elements)
+        count = self._read_count(tag_name, elements, data_type)
+        request = self._add_read_service(ioi, count)
 
         # if we are handling structs (string), we have to
         # remove 2 extra bytes from the data
@@ -330,26 +979,45 @@ class PLC(object):
         else:
             pad = 2
 
-        status, ret_data = self.conn.send(request)
+        status, ret_data = yield ('send', request)
         if not ret_data:
             return Response(tag_name, None, status)
-        data = ret_data[50:]
-        self.Offset += len(data)-pad
-        req = data
+
+        # keep views of each fragment, they are joined once at the end
+        parts = [memoryview(ret_data)[50:]]
+        offset = len(parts[0])-pad
+
+        if status == 6 and self.PipelineDepth > 1 and data_type != 0xa0:
+            # we know the total size and how much fits in each reply,
+            # so the remaining fragments can be requested all at once
+            total = count * self.CIPTypes[data_type][0]
+            offsets = list(range(offset, total, offset))
+            requests = [self._add_partial_read_service(ioi, count, o) for o in offsets]
+
+            replies = yield ('send_many', requests)
+            for o, (status, ret_data) in zip(offsets, replies):
+                if not ret_data:
+                    return Response(tag_name, None, status)
+                if o != offset:
+                    # a fragment came back short, read the rest one at a time
+                    status = 6
+                    break
+                parts.append(memoryview(ret_data)[50+pad:])
+                offset += len(parts[-1])
+                if status != 6:
+                    break
 
         while status == 6:
-            if data_type == 0xd3:
-                request = self._add_partial_read_service(ioi, words)
-            else:
-                request = self._add_partial_read_service(ioi, elements)
-            status, ret_data = self.conn.send(request)
-            data = ret_data[50+pad:]
-            self.Offset += len(data)
-            req += data
+            request = self._add_partial_read_service(ioi, count, offset)
+            status, ret_data = yield ('send', request)
+            if not ret_data:
+                return Response(tag_name, None, status)
+            parts.append(memoryview(ret_data)[50+pad:])
+            offset += len(parts[-1])
 
-        return_values = self._parse_reply(tag_name, elements, req)
+        return_values = self._parse_reply(tag_name, elements, b''.join(parts))
 
-        if return_values:
+        if len(return_values):
             if len(return_values) == 1:
                 value = return_values[0]
             else:
@@ -359,80 +1027,142 @@ class PLC(object):
 
         return Response(tag_name, value, status)
 
-    def _multi_read(self, tags, first):
+    def _iter_read(self, tag, count, chunk):
         """
-        Processes the multiple read request, but only the possible number of tags in a single request. The size
-        difference between tags and result must be check for a complete read
+        Read the elements of an array a chunk at a time, yielding a
+        ('result', response) for each chunk.  Stops after a chunk
+        that couldn't be read
         """
-        service_segs = []
-        segments = b""
-        tag_count = 0
-        self.Offset = 0
-
-        header = self._buildMultiServiceHeader()
-
-        min_tag_size = 24
-        service_segment_size = 8
-
-        for tag in tags:
-            if isinstance(tag, (list, tuple)):
-                tag = tag[0]
-            tag_name, base_tag, index = parse_tag_name(tag)
+        conn = yield ('connect',)
+        if not conn[0]:
+            yield ('result', Response(tag, None, conn[1]))
+            return
+
+        tag, count, data_type = read_args((tag, count, None))
+        tag_name, base_tag, index = parse_tag_name(tag)
+        if isinstance(index, list):
+            raise TypeError('Only one dimensional arrays can be read in chunks')
+        resp = yield from self._initial_read(tag, base_tag, None)
+        if resp[2] != 0 and resp[2] != 6:
+            yield ('result', Response(tag, None, resp[2]))
+            return
 
-            # get the data type if we have accessed the tag before
-            if base_tag in self.KnownTags:
-                data_type = self.KnownTags[base_tag][0]
-                dt_size = self.CIPTypes[data_type][0]
-                if data_type == 0xa0:
-                    dt_size -= 8
+        data_type, size = self.KnownTags[base_tag]
+        if not chunk:
+            # the reply header, data type and struct handle take 10 bytes
+            if data_type == 0xd3:
+                # BOOL arrays are read by the bit, a chunk might not start on a DWORD
+                chunk = ((self.ConnectionSize - 10) // 4 - 1) * 32
             else:
-                #go with the worst case size
-                dt_size = self.CIPTypes[160][0]
-                data_type = None
+                chunk = (self.ConnectionSize - 10) // (size or self.CIPTypes[data_type][0])
+        chunk = max(chunk, 1)
+
+        name = tag[:tag.rindex('[')] if tag.endswith(']') else tag
+        done = 0
+        while done < count:
+            elements = min(chunk, count - done)
+            response = yield from self._read_tag('{}[{}]'.format(name, index + done), elements, None)
+            if elements == 1 and response.Value is not None:
+                response.Value = [response.Value]
+            yield ('result', response)
+            if response.Value is None:
+                return
+            done += elements
+
+    def _read_count(self, tag_name, elements, data_type):
+        """
+        Number of elements to ask for, BOOL arrays and bits
+        of a word are read as whole words
+        """
+        tag, base_tag, index = parse_tag_name(tag_name)
+        bit_count = self.CIPTypes[data_type][0] * 8
+        if data_type == 0xd3:
+            # bool array
+            return get_word_count(index, elements, bit_count)
+        elif bit_of_word(tag):
+            # bits of word
+            split_tag = tag_name.split('.')
+            bit_pos = split_tag[len(split_tag)-1]
+            bit_pos = int(bit_pos)
+            return get_word_count(bit_pos, elements, bit_count)
+        else:
+            # everything else
+            return elements
+
+    def _plan_multi_read(self, tags, first):
+        """
+        Split the tags up into as few multiple read requests as
+        possible.  The request and reply size of each tag is worked
+        out exactly when its data type is known, then the biggest
+        tags are placed first, each into the first request that still
+        has room for both (first-fit-decreasing).
+        Returns a list of requests with the index of each tag in them,
+        and the index of the tags too big to share a request
+        """
+        # the sequence count takes 2 bytes of the connection size, the
+        # multi-service header or reply header and service count 8 or 6
+        limit = self.ConnectionSize - 2
+        request_overhead = 8
+        reply_overhead = 6
+
+        sizes = []
+        services = []
+        large = []
+        for i, tag in enumerate(tags):
+            tag, elements, data_type = read_args(tag)
+            tag_name, base_tag, index = parse_tag_name(tag)
+            data_type = self.KnownTags.get(base_tag, (None, 0))[0]
 
-            # estimate the size that the response will occupy
-            rsp_tag_size = min_tag_size + len(base_tag) + dt_size
+            count = 1
+            if not first and data_type in self.CIPTypes:
+                count = self._read_count(tag, elements, data_type)
+            elif not first:
+                count = elements
 
             ioi = self._build_ioi(tag_name, data_type)
             if first:
-                read_service = self._add_partial_read_service(ioi, 1)
+                service = self._add_partial_read_service(ioi, count)
             else:
-                read_service = self._add_read_service(ioi, 1)
-
-            next_request_size = service_segment_size + rsp_tag_size + 2
-
-            # check if request size does not exceed (ConnectionSize bytes limit)
-            if next_request_size <= self.ConnectionSize and rsp_tag_size <= self.ConnectionSize:
-                service_segment_size = service_segment_size + rsp_tag_size
-                service_segs.append(read_service)
-                tag_count = tag_count + 1
+                service = self._add_read_service(ioi, count)
+            services.append(service)
+
+            # each service also takes 2 bytes in the offset table
+            reply_size = self._reply_size(base_tag, count) + 2
+            request_size = len(service) + 2
+            if request_overhead + request_size > limit or reply_overhead + reply_size > limit:
+                large.append(i)
             else:
-                break
-
-        tags_effective = tags[0:tag_count]
-        segment_count = pack('<H', tag_count)
-
-        temp = len(header)
-        if tag_count > 2:
-            temp += (tag_count - 2) * 2
-        offsets = pack('<H', temp)
-
-        # assemble all the segments
-        for i in range(tag_count):
-            segments += service_segs[i]
-
-        for i in range(tag_count-1):
-            temp += len(service_segs[i])
-            offsets += pack('<H', temp)
-
-        request = header + segment_count + offsets + segments
-        status, ret_data = self.conn.send(request)
+                sizes.append((reply_size, request_size, i))
+
+        # request size, reply size and tag indexes of each packet
+        packets = []
+        for reply_size, request_size, i in sorted(sizes, reverse=True):
+            for packet in packets:
+                if packet[0] + request_size <= limit and packet[1] + reply_size <= limit:
+                    packet[0] += request_size
+                    packet[1] += reply_size
+                    packet[2].append(i)
+                    break
+            else:
+                packets.append([request_overhead + request_size, reply_overhead + reply_size, [i]])
 
-        # return error if no data is returned
-        if not ret_data:
-            return [Response(t, None, status) for t in tags]
+        plan = []
+        for request_size, reply_size, indexes in sorted(packets, key=lambda p: min(p[2])):
+            indexes.sort()
+            plan.append((multi_service_request([services[i] for i in indexes]), indexes))
+        return plan, large
 
-        return self._parse_multi_read(tags_effective, ret_data)
+    def _reply_size(self, base_tag, count=1):
+        """
+        Size of a tag's reply in a multiple read reply: the reply
+        service, status, data type and values.  Unknown types are
+        assumed to be the worst case, a STRING
+        """
+        data_type, size = self.KnownTags.get(base_tag, (None, 0))
+        if data_type in self.CIPTypes and data_type != 0xa0:
+            return 6 + self.CIPTypes[data_type][0] * count
+        # structs have a 2 byte handle after the type
+        return 8 + (size or self.CIPTypes[0xa0][0]) * count
 
     def _batch_write(self, tags):
         """
@@ -442,29 +1172,60 @@ class PLC(object):
         if self.Micro800 == True:
             return Response(tags, None, 8)
 
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return [Response(t, None, conn[1]) for t in tags[1]]
 
         # format the tags so that we have just the tag name or
-        # the tag name and data type
+        # the tag name, count and data type
         new_tags = []
         for t in tags:
             if len(t) == 3:
-                new_tags.append((t[0], t[2]))
+                new_tags.append((t[0], 1, t[2]))
             else:
                 new_tags.append(t[0])
 
-        self._get_unknown_types(new_tags)
+        yield from self._get_unknown_types(new_tags)
+
+        # build every packet first, so they can all be sent at once,
+        # the plan is the index of each packet or a tag written on its own
+        packets = []
+        plan = []
+        start = 0
+        while start < len(tags):
+            count = 0
+            if start < len(tags) - 1:
+                request, write_values, count = self._build_multi_write(tags[start:])
+            if count:
+                plan.append(len(packets))
+                packets.append((request, write_values, tags[start:start+count]))
+                start += count
+            else:
+                # single tag left over, or too big to share a packet,
+                # can't use multi msg service
+                plan.append(tags[start])
+                start += 1
+
+        # a tag written more than once has to be written in order
+        names = [t[0] for t in tags]
+        ordered = len(set(names)) < len(names)
+
+        replies = []
+        if packets:
+            replies = yield ('send_many', [p[0] for p in packets], ordered)
 
         result = []
-        while len(result) < len(tags):
-            if len(result) == len(tags) - 1:
-                # single tag left over, can't use multi msg service
-                tag = tags[len(result):][0]
-                result.append(self._write_tag(*tag))
+        for item in plan:
+            if isinstance(item, int):
+                request, write_values, written = packets[item]
+                status, ret_data = replies[item]
+                if ret_data:
+                    result.extend(self._parse_multi_write(write_values, ret_data))
+                else:
+                    result.extend(Response(w[0], w[1], status) for w in written)
             else:
-                result.extend(self._multi_write(tags[len(result):]))
+                response = yield from self._write_tag(*item)
+                result.append(response)
 
         return result
 
@@ -472,15 +1233,14 @@ class PLC(object):
         """
         Processes the write request
         """
-        self.Offset = 0
         write_data = []
 
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(tag_name, value, conn[1])
 
         tag, base_tag, index = parse_tag_name(tag_name)
-        resp = self._initial_read(tag, base_tag, data_type)
+        resp = yield from self._initial_read(tag, base_tag, data_type)
         if resp[2] != 0 and resp[2] != 6:
             return Response(tag_name, None, resp[2])
 
@@ -493,6 +1253,13 @@ class PLC(object):
             elements = 1
             value = [value]
 
+        if data_type == 0xa0 and value and isinstance(value[0], (dict, bytes, bytearray)):
+            # whole UDT's, or their packed bytes
+            status = yield from self._write_udt(tag_name, base_tag, value)
+            if len(value) == 1:
+                value = value[0]
+            return Response(tag_name, value, status)
+
         # format the values
         for v in value:
             if data_type == 0xca or data_type == 0xcb:
@@ -513,10 +1280,11 @@ class PLC(object):
         # handle sending the write data
         if len(write_data) > 1:
             # write requires multiple packets
+            offset = 0
             for w in write_data:
-                request = self._add_frag_write_service(element_count, ioi, w, data_type)
-                status, ret_data = self.conn.send(request)
-                self.Offset += len(w)*self.CIPTypes[data_type][0]
+                request = self._add_frag_write_service(element_count, ioi, w, data_type, offset)
+                status, ret_data = yield ('send', request)
+                offset += len(w)*self.CIPTypes[data_type][0]
         else:
             # write fits in one packet
             if bit_of_word(tag_name) or data_type == 0xd3:
@@ -525,31 +1293,70 @@ class PLC(object):
                 for i in range(len(high)):
                     ioi = self._build_ioi(tags[i], data_type)
                     request = self._add_mod_write_service(ioi, data_type, high[i], low[i])
-                    status, ret_data = self.conn.send(request)
+                    status, ret_data = yield ('send', request)
             else:
                 request = self._add_write_service(ioi, write_data[0], data_type)
 
-                status, ret_data = self.conn.send(request)
+                status, ret_data = yield ('send', request)
 
         if len(value) == 1:
             value = value[0]
 
         return Response(tag_name, value, status)
 
-    def _multi_write(self, write_data):
+    def _write_udt(self, tag_name, base_tag, values):
         """
-        Processes the multiple write request
+        Write whole UDT's, packed with the structure object of the UDT
+        (unless they are bytes already) and sent with its structure
+        handle.  Split into fragments when they don't fit in one
+        request.  Returns the status
+        """
+        ioi = self._build_ioi(tag_name, 0xa0)
+        if base_tag not in self._handles:
+            # the handle comes back with the value
+            status, ret_data = yield ('send', self._add_partial_read_service(ioi, 1))
+            if status not in (0, 6) or not ret_data:
+                return status
+            self._handles[base_tag] = unpack_from('<H', ret_data, 52)[0]
+
+        handle = self._handles[base_tag]
+        if isinstance(values[0], (bytes, bytearray)):
+            data = b''.join(values)
+        else:
+            codec = self._udt_codec(handle)
+            if codec is None:
+                return 'UDT definition not found, call GetTagList() first'
+            data = b''.join(codec[0].pack(v) for v in values)
+
+        # fragments start on a 4 byte boundary
+        space = (self.ConnectionSize - 110 - len(ioi)) // 4 * 4
+        header = pack('<BBH', 0xa0, 0x02, handle)
+        if len(data) <= space:
+            request = pack('<BB', 0x4D, len(ioi) // 2) + ioi + header + pack('<H', len(values)) + data
+            status, ret_data = yield ('send', request)
+            return status
+
+        requests = [pack('<BB', 0x53, len(ioi) // 2) + ioi + header + pack('<HI', len(values), offset) +
+                    data[offset:offset + space] for offset in range(0, len(data), space)]
+        replies = yield ('send_many', requests, True)
+        for status, ret_data in replies:
+            if status:
+                return status
+        return 0
+
+    def _build_multi_write(self, write_data):
+        """
+        Build a multiple write request for as many of the tags as fit
+        in one packet.  Returns the request, what is written by each
+        of its services and how many of the tags it writes
         """
         service_segs = []
-        segments = b""
         tag_count = 0
-        self.Offset = 0
+        written = 0
 
         min_tag_size = 24
         service_segment_size = 8
 
-        header = self._buildMultiServiceHeader()
-
         write_values = []
         for wd in write_data:
 
@@ -602,13 +1409,16 @@ class PLC(object):
                         tag_count = tag_count + 1
                     else:
                         # BOOLs didn't fit in the current packet, abort
-                        bools_fit = True
+                        bools_fit = False
                         tag_count = tmp_count
                         break
                 if bools_fit:
                     # if the bools fit in this request, append them.
                     write_values.extend(tmp_write_values)
                     service_segs.extend(temp_segments)
+                    written += 1
+                else:
+                    break
             else:
                 ioi = self._build_ioi(tag_name, data_type)
                 write_service = self._add_write_service(ioi, value, data_type)
@@ -620,38 +1430,18 @@ class PLC(object):
                     service_segment_size = service_segment_size + rsp_tag_size
                     service_segs.append(write_service)
                     tag_count = tag_count + 1
+                    written += 1
                 else:
                     break
 
-        segment_count = pack('<H', tag_count)
-
-        temp = len(header)
-        if tag_count > 2:
-            temp += (tag_count - 2) * 2
-        offsets = pack('<H', temp)
-
-        # assemble all the segments
-        for i in range(tag_count):
-            segments += service_segs[i]
-
-        for i in range(tag_count-1):
-            temp += len(service_segs[i])
-            offsets += pack('<H', temp)
-
-        request = header + segment_count + offsets + segments
-        status, ret_data = self.conn.send(request)
-
-        # return error if no data is returned
-        if not ret_data:
-            return [Response(w[0], w[1], status) for w in write_data]
-
-        return self._parse_multi_write(write_values, ret_data)
+        request = multi_service_request(service_segs[:tag_count])
+        return request, write_values[:tag_count], written
 
     def _getPLCTime(self, raw=False):
         """
         Requests the PLC clock time
         """
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(None, None, conn[1])
 
@@ -674,8 +1464,7 @@ class PLC(object):
                         AttributeCount,
                         TimeAttribute)
 
-        print(request)
-        status, ret_data = self.conn.send(request)
+        status, ret_data = yield ('send', request)
 
         if status == 0:
             # get the time from the packet
@@ -694,7 +1483,7 @@ class PLC(object):
         """
         Requests the an arbitrary unconnected service from the PLC/device in unconnected mode.
         """
-        conn = self.conn.connect(False)
+        conn = yield ('connect', False)
         if not conn[0]:
             return Response(None, None, conn[1])
       
@@ -732,9 +1521,9 @@ class PLC(object):
         if data is not None:
             request += data
 
-        print(request)
-        status, ret_data = self.conn.send(request, connected=False, slot=0)
-
+        status, ret_data = yield ('send', request, False, 0)
+        if ret_data:
+            ret_data = bytes(ret_data)
 
         return Response(None, ret_data, status)
 
@@ -743,7 +1532,7 @@ class PLC(object):
         """
         Requests the PLC clock time
         """
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(None, None, conn[1])
 
@@ -770,7 +1559,7 @@ class PLC(object):
                         DSTAttribute,
                         time.daylight)
 
-        status, ret_data = self.conn.send(request)
+        status, ret_data = yield ('send', request)
 
         return Response(None, Time, status)
 
@@ -778,42 +1567,36 @@ class PLC(object):
         """
         Requests the controller tag list and returns a list of Tag type
         """
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(None, None, conn[1])
 
-        self.Offset = 0
         status = 6
         tags = []
+        instance = 0
 
         while status == 6:
-            request = self._buildTagListRequest(programName=None)
-            status, ret_data = self.conn.send(request)
+            request = self._buildTagListRequest(None, instance)
+            status, ret_data = yield ('send', request)
             if status == 0 or status == 6:
-                tags += self._parse_packet(ret_data, programName=None)
-                self.Offset += 1
+                packet_tags, instance = self._parse_packet(ret_data, programName=None)
+                tags += packet_tags
+                instance += 1
             else:
                 return Response(None, None, status)
 
         if allTags:
             for program_name in self.ProgramNames:
-
-                self.Offset = 0
-
-                request = self._buildTagListRequest(program_name)
-                status, ret_data = self.conn.send(request)
-                if status == 0 or status == 6:
-                    tags += self._parse_packet(ret_data, program_name)
-                    self.Offset += 1
-                else:
-                    return Response(None, None, status)
+                status = 6
+                instance = 0
 
                 while status == 6:
-                    self.Offset += 1
-                    request = self._buildTagListRequest(program_name)
-                    status, ret_data = self.conn.send(request)
+                    request = self._buildTagListRequest(program_name, instance)
+                    status, ret_data = yield ('send', request)
                     if status == 0 or status == 6:
-                        tags += self._parse_packet(ret_data, program_name)
+                        packet_tags, instance = self._parse_packet(ret_data, program_name)
+                        tags += packet_tags
+                        instance += 1
                     else:
                         return Response(None, None, status)
 
@@ -824,26 +1607,21 @@ class PLC(object):
         """
         Requests tag list for a specific program and returns a list of Tag type
         """
-        conn = self.conn.connect()
+        conn = yield ('connect',)
         if not conn[0]:
             return Response(None, None, conn[1])
 
-        self.Offset = 0
+        status = 6
         tags = []
-
-        request = self._buildTagListRequest(programName)
-        status, ret_data = self.conn.send(request)
-        if status == 0 or status == 6:
-            tags += self._parse_packet(ret_data, programName)
-        else:
-            return Response(None, None, status)
+        instance = 0
 
         while status == 6:
-            self.Offset += 1
-            request = self._buildTagListRequest(programName)
-            status, ret_data = self.conn.send(request)
+            request = self._buildTagListRequest(programName, instance)
+            status, ret_data = yield ('send', request)
             if status == 0 or status == 6:
-                tags += self._parse_packet(ret_data, programName)
+                packet_tags, instance = self._parse_packet(ret_data, programName)
+                tags += packet_tags
+                instance += 1
             else:
                 return Response(None, None, status)
 
@@ -863,26 +1641,33 @@ class PLC(object):
 
         self.UDT = {}
         self.UDTByName = {}
+        self._codecs = {}
         template = {}
         while len(unique):
             iterTemplate = {}
+            names = {}
             for u in unique:
                 if not u.DataTypeValue in self.UDT.keys():
-                    temp = self._getTemplateAttribute(u.DataTypeValue)
-
-                    block = temp[46:]
-                    if len(block) > 24:
-                        val = unpack_from('<I', block, 10)[0]
-                        words = (val * 4) - 23
-                        size = int(math.ceil(words / 4.0)) * 4
-                        member_count = int(unpack_from('<H', block, 24)[0])
-                        iterTemplate[u.DataTypeValue] = template[u.DataTypeValue] = [size, '', member_count]
-                    else:
-                        print("Received invalid template attribute for", u.TagName)
+                    names.setdefault(u.DataTypeValue, u.TagName)
+
+            # the attributes of every new template, then their definitions
+            all_attributes = yield from self._getTemplateAttributes(list(names))
+            for instance, attributes in all_attributes.items():
+                if 4 in attributes and 2 in attributes:
+                    val = attributes[4]
+                    words = (val * 4) - 23
+                    size = int(math.ceil(words / 4.0)) * 4
+                    member_count = attributes[2]
+                    iterTemplate[instance] = template[instance] = [size, '', member_count,
+                                                                   attributes.get(5, 0),
+                                                                   attributes.get(1, 0)]
+                else:
+                    print("Received invalid template attribute for", names[instance])
 
             unique = []
+            definitions = yield from self._getTemplates(dict((key, value[0]) for key, value in iterTemplate.items()))
             for key, value in iterTemplate.items():
-                t = self._getTemplate(key, value[0])
+                t = definitions[key]
                 member_count = value[2]
                 size = member_count * 8
                 p = t[50:]
@@ -897,6 +1682,8 @@ class PLC(object):
                 udt = UDT()
                 udt.Type = key
                 udt.Name = name
+                udt.Size = value[3]
+                udt.Handle = value[4]
                 for i in range(1, member_count + 1):
                     field = Tag()
                     field.UDT = udt
@@ -950,36 +1737,136 @@ class PLC(object):
                 elif field.SymbolType in self.CIPTypes:
                     field.DataType = self.CIPTypes[field.SymbolType][1]
 
+        self._store_struct_sizes(tag_list)
         return tag_list
 
-    def _getTemplateAttribute(self, instance):
+    def _store_struct_sizes(self, tags):
         """
-        Get the attributes of a UDT
+        A struct always comes back as 0xa0, knowing its size from the
+        template lets the multi-service requests be packed tight.  The
+        struct tags are kept to find their members in a read
         """
-        request = self._buildTemplateAttributes(instance)
-        status, ret_data = self.conn.send(request)
-        return ret_data
+        for tag in tags:
+            udt = self.UDT.get(tag.DataTypeValue)
+            if tag.Struct and udt is not None and udt.Size:
+                self.KnownTags[tag.TagName] = (0xa0, udt.Size)
+                self._handles[tag.TagName] = udt.Handle
+                self._structs[tag.TagName] = tag
+
+    def _udt_codec(self, handle):
+        """
+        The structure object and size of a UDT, found by the structure
+        handle that comes back with its value.  Built from the template
+        the first time, None if the UDT isn't in the tag list
+        """
+        if handle not in self._codecs:
+            self._codecs[handle] = None
+            for template in self.UDT.values():
+                if template.Handle == handle:
+                    try:
+                        codec = from_template(template, self.UDT, self.StringEncoding)
+                        self._codecs[handle] = (codec, template.Size)
+                    except ValueError:
+                        pass
+                    break
+        return self._codecs[handle]
+
+    def _unpack_udt(self, data, offset, elements=None):
+        """
+        Decode the UDT values that follow the structure handle at offset,
+        all of them or just the number of elements.  Returns a list of
+        dicts, or None when they can't be decoded
+        """
+        codec = self._udt_codec(unpack_from('<H', data, offset)[0])
+        if codec is None:
+            return None
+        codec, size = codec
+        offset += 2
+        count = (len(data) - offset) // size if size else 0
+        if elements is not None:
+            count = min(count, elements)
+        if not count:
+            return None
+        if self.ArrayResults and count > 1:
+            values = unpack_records(codec, data, offset, count, size)
+            if values is not None:
+                return values
+        return codec.unpack_many(data, count, offset, size)
+
+    def _getTemplateAttributes(self, instances):
+        """
+        Get the attributes of several UDT's, as many to a
+        multi-service request as will fit.  Returns a dict of
+        the attributes of each template
+        """
+        if not instances:
+            return {}
+
+        # each attribute reply, with its offset, is 36 bytes at most,
+        # the reply header, service count and sequence count take 8
+        per_packet = max(1, (self.ConnectionSize - 8) // 36)
+        packets = [instances[i:i+per_packet] for i in range(0, len(instances), per_packet)]
+        requests = [multi_service_request([self._buildTemplateAttributes(i) for i in packet])
+                    for packet in packets]
+
+        result = dict((instance, {}) for instance in instances)
+        replies = yield ('send_many', requests)
+        for packet, (status, ret_data) in zip(packets, replies):
+            if not ret_data or status:
+                continue
+            stripped = ret_data[50:]
+            offsets = list(unpack_from('<{}H'.format(len(packet)), stripped, 2)) + [len(stripped)]
+            for i, instance in enumerate(packet):
+                reply = stripped[offsets[i]:offsets[i+1]]
+                if not reply[2]:
+                    result[instance] = self._parse_template_attributes(reply)
+        return result
 
-    def _getTemplate(self, instance, dataLen):
-        """
-        Get the members of a UDT so we can get it
-        """
-        data = b''
-        status = 0
-        partOffset = 0
-        remaining = dataLen
-        while remaining > 0 and not status:
-            request = self._readTemplateService(instance, remaining, partOffset)
-            status, ret_data = self.conn.send(request)
-            if status == 6:
-                status = 0
-            if len(data):
-                part = ret_data[50:]
-                ret_data = part
-            data = data + ret_data
-            partOffset = len(data) - 50
-            remaining = dataLen - partOffset
-        return data
+    def _getTemplates(self, sizes):
+        """
+        Get the members of several UDT's.  The first reply of each
+        template shows how much fits in a reply, after that the rest
+        of every template is requested at once.  Returns a dict of
+        the definition of each template, the first reply's header
+        is kept so that the data always starts at byte 50
+        """
+        parts = dict((instance, []) for instance in sizes)
+        received = dict((instance, 0) for instance in sizes)
+        fragment = {}
+        pending = list(sizes)
+        while pending:
+            requests = []
+            starts = []
+            for instance in pending:
+                if instance in fragment:
+                    offsets = range(received[instance], sizes[instance], fragment[instance])
+                else:
+                    offsets = [received[instance]]
+                for offset in offsets:
+                    requests.append(self._readTemplateService(instance, sizes[instance] - offset, offset))
+                    starts.append((instance, offset))
+
+            done = set()
+            replies = yield ('send_many', requests)
+            for (instance, offset), (status, ret_data) in zip(starts, replies):
+                if instance in done or offset != received[instance]:
+                    # finished, or a reply before it came back short,
+                    # carry on from where it got to next time around
+                    continue
+                if not ret_data or status not in (0, 6):
+                    done.add(instance)
+                    continue
+                if not parts[instance]:
+                    parts[instance].append(memoryview(ret_data)[:50])
+                parts[instance].append(memoryview(ret_data)[50:])
+                received[instance] += len(parts[instance][-1])
+                fragment[instance] = min(fragment.get(instance, sizes[instance]), len(parts[instance][-1]))
+                if status == 0 or received[instance] >= sizes[instance] or not fragment[instance]:
+                    done.add(instance)
+
+            pending = [instance for instance in pending if instance not in done]
+
+        return dict((instance, b''.join(p)) for instance, p in parts.items())
 
     def _buildTemplateAttributes(self, instance):
         """
@@ -994,7 +1881,7 @@ class PLC(object):
         TemplateInstance = instance
         AttribCount = 0x04
         Attrib4 = 0x04
-        Attrib3 = 0x03
+        Attrib5 = 0x05
         Attrib2 = 0x02
         Attrib1 = 0x01
 
@@ -1007,10 +1894,34 @@ class PLC(object):
                     TemplateInstance,
                     AttribCount,
                     Attrib4,
-                    Attrib3,
+                    Attrib5,
                     Attrib2,
                     Attrib1)
 
+    def _parse_template_attributes(self, data):
+        """
+        Parse the Get Attribute List reply of a template into a
+        dict of attribute: value.  Attributes 4 (definition size in
+        words) and 5 (structure size in bytes) are UDINT, the rest UINT
+        """
+        attributes = {}
+        if len(data) < 6:
+            return attributes
+        count = unpack_from('<H', data, 4)[0]
+        offset = 6
+        for i in range(count):
+            if offset + 4 > len(data):
+                break
+            attribute, status = unpack_from('<HH', data, offset)
+            offset += 4
+            if status:
+                # no value follows an attribute that failed
+                continue
+            fmt = '<I' if attribute in (4, 5) else '<H'
+            attributes[attribute] = unpack_from(fmt, data, offset)[0]
+            offset += calcsize(fmt)
+        return attributes
+
     def _readTemplateService(self, instance, dataLen, offset = 0):
         """
         Build the template attribute packet, part of
@@ -1040,7 +1951,7 @@ class PLC(object):
         Request the properties of a module in a particular
         slot.  Returns Device()
         """
-        conn = self.conn.connect(False)
+        conn = yield ('connect', False)
         if not conn[0]:
             return Response(None, Device(), conn[1])
 
@@ -1059,7 +1970,7 @@ class PLC(object):
                         AttributeInstanceType,
                         AttributeInstance)
 
-        status, ret_data = self.conn.send(request, False, slot)
+        status, ret_data = yield ('send', request, False, slot)
         pad = pack('<I', 0x00)
         ret_data = pad + ret_data
 
@@ -1073,7 +1984,7 @@ class PLC(object):
         Request the properties of a device at the
         specified IP address.  Returns Device()
         """
-        conn = self.conn.connect(False)
+        conn = yield ('connect', False)
         if not conn[0]:
             return Response(None, Device(), conn[1])
 
@@ -1092,7 +2003,7 @@ class PLC(object):
                         AttributeInstanceType,
                         AttributeInstance)
 
-        status, ret_data = self.conn.send(request, False)
+        status, ret_data = yield ('send', request, False)
         pad = pack('<I', 0x00)
         ret_data = pad + ret_data
 
@@ -1174,30 +2085,53 @@ class PLC(object):
                         tag_size += 1
                         ioi += pack('<B', 0x00)
 
+        if self.InstanceAddressing and self.InstanceIDs:
+            ioi = self._instance_ioi(tag_name, ioi)
         return ioi
 
+    def _instance_ioi(self, tag_name, ioi):
+        """
+        Replace the tag name at the start of a symbolic IOI with the
+        tag's symbol instance (class 0x6B), from the tag list.  Program
+        scoped tags keep the program name, members and elements are
+        left as they are.  Tags not in the tag list are left symbolic
+        """
+        names = tag_name.split('.')
+        scope = ''
+        if names[0].lower().startswith('program:'):
+            scope = names.pop(0) + '.'
+        symbol = names[0].split('[')[0]
+        instance = self.InstanceIDs.get((scope + symbol).lower())
+        if instance is None:
+            return ioi
+
+        # skip over the symbolic segments of the program and the tag
+        position = 0
+        prefix = b''
+        for i in range(2 if scope else 1):
+            size = ioi[position+1]
+            position += 2 + size + size % 2
+            if scope and i == 0:
+                prefix = ioi[:position]
+
+        if instance < 256:
+            segment = pack('<HBB', 0x6B20, 0x24, instance)
+        else:
+            segment = pack('<HHH', 0x6B20, 0x25, instance)
+        return prefix + segment + ioi[position:]
+
     def _add_read_service(self, ioi, elements):
         """
         Add the read service to the tagIOI
         """
-        request_service = 0x4C
-        request_size = int(len(ioi)/2)
-        read_service = pack('<BB', request_service, request_size)
-        read_service += ioi
-        read_service += pack('<H', int(elements))
-        return read_service
+        return read_request(ioi, int(elements))
 
-    def _add_partial_read_service(self, ioi, elements):
+    def _add_partial_read_service(self, ioi, elements, offset=0):
         """
-        Add the partial read service to the tag IOI
+        Add the partial read service to the tag IOI, offset is
+        the byte offset to start reading from
         """
-        request_service = 0x52
-        request_size = int(len(ioi)/2)
-        read_service = pack('<BB', request_service, request_size)
-        read_service += ioi
-        read_service += pack('<H', int(elements))
-        read_service += pack('<I', self.Offset)
-        return read_service
+        return partial_read_request(ioi, int(elements), offset)
 
     def _add_write_service(self, ioi, write_data, data_type):
         """
@@ -1246,9 +2180,10 @@ class PLC(object):
 
         return write_request
 
-    def _add_frag_write_service(self, count, ioi, write_data, data_type):
+    def _add_frag_write_service(self, count, ioi, write_data, data_type, offset):
         """
-        Add the fragmented write command stuff to the tagIOI
+        Add the fragmented write command stuff to the tagIOI, offset
+        is the byte offset this fragment starts at
         """
         path_size = int(len(ioi)/2)
         service = 0x53
@@ -1261,7 +2196,7 @@ class PLC(object):
         else:
             request += pack('<H', data_type)
         request += pack('<H', count)
-        request += pack('<I', self.Offset)
+        request += pack('<I', offset)
 
         for v in write_data:
             try:
@@ -1273,28 +2208,9 @@ class PLC(object):
 
         return request
 
-    def _buildMultiServiceHeader(self):
-        """
-        Service header for making a multiple tag request
-        """
-        MultiService = 0X0A
-        MultiPathSize = 0x02
-        MutliClassType = 0x20
-        MultiClassSegment = 0x02
-        MultiInstanceType = 0x24
-        MultiInstanceSegment = 0x01
-
-        return pack('<BBBBBB',
-                    MultiService,
-                    MultiPathSize,
-                    MutliClassType,
-                    MultiClassSegment,
-                    MultiInstanceType,
-                    MultiInstanceSegment)
-
-    def _buildTagListRequest(self, programName):
+    def _buildTagListRequest(self, programName, instance=0):
         """
-        Build the request for the PLC tags
+        Build the request for the PLC tags, starting at instance
         Program scoped tags will pass the program name for the request
         """
         Service = 0x55
@@ -1309,10 +2225,10 @@ class PLC(object):
 
         PathSegment += pack('<H', 0x6B20)
 
-        if self.Offset < 256:
-            PathSegment += pack('<BB', 0x24, self.Offset)
+        if instance < 256:
+            PathSegment += pack('<BB', 0x24, instance)
         else:
-            PathSegment += pack('<HH', 0x25, self.Offset)
+            PathSegment += pack('<HH', 0x25, instance)
 
         PathSegmentLen = int(len(PathSegment)/2)
         AttributeCount = 0x03
@@ -1333,21 +2249,25 @@ class PLC(object):
         """
         tag, base_tag, index = parse_tag_name(tag_name)
         data_type = self.KnownTags[base_tag][0]
-        bit_count = self.CIPTypes[data_type][0] * 8
 
-        # if bit of word was requested
-        if bit_of_word(tag_name):
-            split_tag = tag_name.split('.')
-            bit_pos = split_tag[len(split_tag)-1]
-            bit_pos = int(bit_pos)
+        # bits of a word or a bool array, the words are little endian
+        # so the bits can be taken straight from the bytes
+        if bit_of_word(tag_name) or data_type == 0xd3:
+            if data_type == 0xd3:
+                bit_pos = index % 32
+            else:
+                bit_pos = int(tag_name.split('.')[-1])
 
-            word_count = get_word_count(bit_pos, elements, bit_count)
-            words = self._get_values(tag_name, word_count, data)
-            vals = self._words_to_bits(tag_name, words, count=elements)
-        elif data_type == 0xd3:
-            word_count = get_word_count(index, elements, bit_count)
-            words = self._get_values(tag_name, word_count, data)
-            vals = self._words_to_bits(tag_name, words, count=elements)
+            if self.PackedBits and elements > 1:
+                vals = [pack_bits(data, 2, bit_pos, elements)]
+            else:
+                vals = unpack_bits(data, 2, bit_pos, elements, self.ArrayResults and elements > 1)
+        elif self.ArrayResults and elements > 1 and data_type not in (0xa0, 0xda):
+            # unpack the whole array at once into a numpy or array.array
+            count = (len(data)-2) // self.CIPTypes[data_type][0]
+            vals = unpack_array(self.CIPTypes[data_type][2], data, 2, count)
+            if vals is None:
+                vals = self._get_values(tag_name, elements, data)
         else:
             vals = self._get_values(tag_name, elements, data)
 
@@ -1369,11 +2289,14 @@ class PLC(object):
         # this is going to check if the data type was a struct
         # if so, return the raw data
         if data_type == 0xa0:
-            tmp = unpack_from('<h', data, 2)[0]
+            tmp = unpack_from('<H', data, 2)[0]
+            if tmp != self.StringID and self.UDTResults:
+                udt_values = self._unpack_udt(data, 2)
+                if udt_values is not None:
+                    return udt_values
             if tmp != self.StringID:
                 d = data[4:4+len(data)]
                 vals.append(d)
-                self.Offset += len(data)
                 return vals
 
         while True:
@@ -1387,24 +2310,20 @@ class PLC(object):
                 vals.append(str(s.decode(self.StringEncoding)))
 
             elif data_type == 0xda:
-                # remove the data type
-                data = data[2:] 
-                while len(data) > 0:
-                    # get the next string length
-                    length = unpack_from('<B', data, 0)[0]
-                    # remove the length from the packet
-                    data = data[1:]
-                    # grab the string
-                    s = data[:length]
+                # skip the data type, then walk the length prefixed strings
+                pos = 2
+                while pos < len(data):
+                    length = data[pos]
+                    s = data[pos+1:pos+1+length]
                     vals.append(str(s.decode(self.StringEncoding)))
-                    # remove the string from the packet
-                    data = data[length:]
+                    pos += 1 + length
                 break
             else:
-                returnvalue = unpack_from(fmt, data, index)[0]
-                vals.append(returnvalue)
+                # unpack every value in one go
+                count = (len(data)-2) // data_size
+                vals = list(unpack_from('<{}{}'.format(count, fmt[-1]), data, 2))
+                break
 
-            self.Offset += data_size
             counter += 1
 
         return vals
@@ -1414,36 +2333,33 @@ class PLC(object):
         Retrieve the data types of tags we have not read yet
         """
         unk_tags = []
+        unk_bases = set()
         for t in tags:
-            if isinstance(t, (list, tuple)):
-                tag_name, base_tag, index = parse_tag_name(t[0])
-                if len(t) == 3:
-                    self.KnownTags[base_tag] = (t[2], 0)
-                else:
-                    unk_tags.append(t[0])
-            else:
-                tag_name, base_tag, index = parse_tag_name(t)
-            if base_tag not in self.KnownTags:
-                unk_tags.append(t)
+            tag, elements, data_type = read_args(t)
+            tag_name, base_tag, index = parse_tag_name(tag)
+            if data_type:
+                if self.KnownTags.get(base_tag, (None, 0))[0] != data_type:
+                    self.KnownTags[base_tag] = (data_type, 0)
+            elif base_tag not in self.KnownTags and base_tag not in unk_bases:
+                # one read per base tag is enough
+                unk_bases.add(base_tag)
+                unk_tags.append(tag)
 
         # get the unknown tags
-        result = []
-        while len(result) < len(unk_tags):
-            if len(result) == len(unk_tags)-1:
-                tag = unk_tags[len(result):][0]
-                if isinstance(tag, (list, tuple)):
-                    data_type = tag[1]
-                else:
-                    data_type = None
-                tag_name, base_tag, index = parse_tag_name(tag)
-                result.append(self._initial_read(tag, base_tag, data_type))
-            else:
-                result.extend(self._multi_read(unk_tags[len(result):], True))
+        if len(unk_tags) == 1:
+            tag_name, base_tag, index = parse_tag_name(unk_tags[0])
+            yield from self._initial_read(unk_tags[0], base_tag, None)
+        elif unk_tags:
+            plan, large = self._plan_multi_read(unk_tags, True)
+            replies = yield ('send_many', [request for request, indexes in plan])
+            for (request, indexes), (status, ret_data) in zip(plan, replies):
+                if ret_data:
+                    self._parse_multi_read([unk_tags[i] for i in indexes], ret_data)
 
     def _initial_read(self, tag, base_tag, data_type):
         """
         Store each unique tag read in a dict so that we can retreive the
-        data type or data length (for STRING) later
+        data type and size of one element later
         """
         # if a tag already exists, return True
         if base_tag in self.KnownTags:
@@ -1456,13 +2372,19 @@ class PLC(object):
         request = self._add_partial_read_service(ioi, 1)
 
         # send our tag read request
-        status, ret_data = self.conn.send(request)
+        status, ret_data = yield ('send', request)
 
         # make sure it was successful
         if status == 0 or status == 6:
             data_type = unpack_from('<B', ret_data, 50)[0]
-            data_len = unpack_from('<H', ret_data, 2)[0]
+            if status == 0:
+                # everything after the type (and struct handle)
+                data_len = len(ret_data) - (54 if data_type == 0xa0 else 52)
+            else:
+                data_len = 0
             self.KnownTags[base_tag] = (data_type, data_len)
+            if data_type == 0xa0:
+                self._handles[base_tag] = unpack_from('<H', ret_data, 52)[0]
             return tag, None, 0
         else:
             return tag, None, status
@@ -1495,75 +2417,84 @@ class PLC(object):
 
         return chunks
 
-    def _words_to_bits(self, tag_name, value, count=0):
+    def _parse_multi_read(self, tags, data, raw=()):
         """
-        Convert words to a list of true/false
+        Takes multi read reply data and returns an array of the values.
+        The values of the tags at the positions in raw are left as the
+        bytes that follow the data type
         """
-        tag, base_tag, index = parse_tag_name(tag_name)
-        data_type = self.KnownTags[base_tag][0]
-        bit_count = self.CIPTypes[data_type][0] * 8
+        # remove the beginning of the packet because we just don't care about it
+        stripped = data[50:]
 
-        if data_type == 0xd3:
-            bit_pos = index % 32
-        else:
-            split_tag = tag.split('.')
-            bit_pos = split_tag[len(split_tag)-1]
-            bit_pos = int(bit_pos)
+        # get the offset values for each of the tags in the packet
+        offsets = [unpack_from('<H', stripped, 2+(i*2))[0] for i in range(len(tags))]
+        offsets.append(len(stripped))
 
-        ret = []
-        for v in value:
-            for i in range(0, bit_count):
-                ret.append(bit_value(v, i))
+        reply = []
+        for i, tag in enumerate(tags):
+            offset = offsets[i]
+            if i in raw:
+                status = stripped[offset+2]
+                value = None if status or stripped[offset+3] else stripped[offset+6:offsets[i+1]]
+                reply.append(Response(read_args(tag)[0], value, status))
+            else:
+                reply.append(self._parse_multi_value(tag, stripped, offset, offsets[i+1]-offset))
 
-        return ret[bit_pos:bit_pos+count]
+        return reply
 
-    def _parse_multi_read(self, tags, data):
+    def _parse_multi_value(self, tag, stripped, offset, length=0):
         """
-        Takes multi read reply data and returns an array of the values
+        Parse the reply of a single tag in a multi read reply.  When
+        the length of the reply is known, the size of a struct is kept
         """
-        # remove the beginning of the packet because we just don't care about it
-        stripped = data[50:]
+        tag, elements, data_type = read_args(tag)
+        status = unpack_from('<b', stripped, offset+2)[0]
+        ext_status = unpack_from('<b', stripped, offset+3)[0]
 
-        # get the offset values for each of the tags in the packet
-        reply = []
-        for i, tag in enumerate(tags):
-            if isinstance(tag, (list, tuple)):
-                tag = tag[0]
-            loc = 2+(i*2)
-            offset = unpack_from('<H', stripped, loc)[0]
-            status = unpack_from('<b', stripped, offset+2)[0]
-            ext_status = unpack_from('<b', stripped, offset+3)[0]
-
-            # successful reply, add the value to our list
-            if status == 0 and ext_status == 0:
-                data_type = unpack_from('<B', stripped, offset+4)[0]
-                tag_name, base_tag, index = parse_tag_name(tag)
-                self.KnownTags[base_tag] = (data_type, 0)
-                # if bit of word was requested
-                if bit_of_word(tag):
-                    type_fmt = self.CIPTypes[data_type][2]
-                    val = unpack_from(type_fmt, stripped, offset+6)[0]
-                    bit_state = bit_of_word_state(tag, val)
-                    response = Response(tag, bit_state, status)
-                elif data_type == 0xd3:
-                    type_fmt = self.CIPTypes[data_type][2]
-                    val = unpack_from(type_fmt, stripped, offset+6)[0]
-                    bit_state = bit_of_word_state(tag, val)
-                    response = Response(tag, bit_state, status)
-                elif data_type == 0xa0:
+        # successful reply, add the value to our list
+        if status == 0 and ext_status == 0:
+            data_type = unpack_from('<B', stripped, offset+4)[0]
+            tag_name, base_tag, index = parse_tag_name(tag)
+            if data_type == 0xa0:
+                size = (length - 8) // elements if length else self.KnownTags.get(base_tag, (None, 0))[1]
+            else:
+                size = self.CIPTypes.get(data_type, (0,))[0]
+            self.KnownTags[base_tag] = (data_type, size)
+            if elements != 1 and length:
+                # several elements, parsed like the reply of a single read
+                values = self._parse_reply(tag, elements, stripped[offset+4:offset+length])
+                value = values[0] if len(values) == 1 else values
+                response = Response(tag, value, status)
+            # if bit of word was requested
+            elif bit_of_word(tag):
+                type_fmt = self.CIPTypes[data_type][2]
+                val = unpack_from(type_fmt, stripped, offset+6)[0]
+                bit_state = bit_of_word_state(tag, val)
+                response = Response(tag, bit_state, status)
+            elif data_type == 0xd3:
+                type_fmt = self.CIPTypes[data_type][2]
+                val = unpack_from(type_fmt, stripped, offset+6)[0]
+                bit_state = bit_of_word_state(tag, val)
+                response = Response(tag, bit_state, status)
+            elif data_type == 0xa0:
+                values = None
+                if self.UDTResults and unpack_from('<H', stripped, offset+6)[0] != self.StringID:
+                    values = self._unpack_udt(stripped, offset+6, 1)
+                if values:
+                    value = values[0]
+                else:
                     strlen = unpack_from('<B', stripped, offset+8)[0]
                     s = stripped[offset+12:offset+12+strlen]
                     value = str(s.decode(self.StringEncoding))
-                    response = Response(tag, value, status)
-                else:
-                    type_fmt = self.CIPTypes[data_type][2]
-                    value = unpack_from(type_fmt, stripped, offset+6)[0]
-                    response = Response(tag, value, status)
+                response = Response(tag, value, status)
             else:
-                response = Response(tag, None, status)
-            reply.append(response)
+                type_fmt = self.CIPTypes[data_type][2]
+                value = unpack_from(type_fmt, stripped, offset+6)[0]
+                response = Response(tag, value, status)
+        else:
+            response = Response(tag, None, status)
 
-        return reply
+        return response
 
     def _parse_multi_write(self, write_data, data):
         # remove the beginning of the packet because we just don't care about it
@@ -1586,17 +2517,22 @@ class PLC(object):
         return reply
 
     def _parse_packet(self, data, programName):
+        """
+        Parse a page of the tag list.  Returns the tags and the
+        instance of the last tag, the next page starts after it
+        """
         # the first tag in a packet starts at byte 50
         packet_start = 50
         tag_list = []
+        instance = 0
 
         while packet_start < len(data):
             # get the length of the tag name
             tag_len = unpack_from('<H', data, packet_start+4)[0]
             # get a single tag from the packet
             packet = data[packet_start:packet_start+tag_len+20]
-            # extract the offset
-            self.Offset = unpack_from('<H', packet, 0)[0]
+            # extract the instance
+            instance = unpack_from('<H', packet, 0)[0]
             # add the tag to our tag list
             tag = Tag.parse(packet, programName)
 
@@ -1612,7 +2548,7 @@ class PLC(object):
             # increment ot the next tag in the packet
             packet_start = packet_start + tag_len + 20
 
-        return tag_list
+        return tag_list, instance
 
     def _make_string(self, string):
         work = []
@@ -1636,6 +2572,14 @@ def bit_of_word_state(tag, value):
     value provided
     ex: (bit 4 of the number 30313 is False)
     """
+    return bit_value(value, bit_of_word_index(tag))
+
+def bit_of_word_index(tag):
+    """
+    Find the array/bit element at the end of a tag
+    and return the bit it is within its word
+    ex: MyBools[37] and MyDINT.5 return 5
+    """
     bit_pattern = r'\d+$'
     array_pattern = r'\[([\d]|[,]|[\s])*\]$'
     try:
@@ -1644,9 +2588,7 @@ def bit_of_word_state(tag, value):
     except:
         index = re.search(bit_pattern, tag).group(0)
 
-    index = int(index) % 32
-
-    return bit_value(value, index)
+    return int(index) % 32
 
 def get_word_count(start, length, bits):
     """
@@ -1661,6 +2603,29 @@ def get_word_count(start, length, bits):
     total_words = (new_end - 1) / bits
     return int(total_words + 1)
 
+def read_args(tag):
+    """
+    Split an item of a list of tags to read into the tag name,
+    element count and data type.  Items are either the tag name,
+    (tag, count) or (tag, count, datatype).  A range of elements,
+    MyArray[10:500], is the first element and the count
+    """
+    if not isinstance(tag, (list, tuple)):
+        tag, elements, data_type = tag, 1, None
+    else:
+        elements = tag[1] if len(tag) > 1 else 1
+        data_type = tag[2] if len(tag) > 2 else None
+        tag = tag[0]
+
+    if tag.endswith(']') and ':' in tag:
+        span = re.search(r'\[(\d+):(\d+)\]$', tag)
+        if span:
+            start, end = int(span.group(1)), int(span.group(2))
+            if end <= start:
+                raise ValueError('The end of the range should be after the start: {}'.format(tag))
+            return '{}[{}]'.format(tag[:span.start()], start), end - start, data_type
+    return tag, elements, data_type
+
 def parse_tag_name(tag):
     """
     Parse the tag name into it's base tag (remove array index and/or
@@ -1778,3 +2743,12 @@ def bit_value(value, bitno):
         return True
     else:
         return False
+
+def owner_indexes(owner):
+    """
+    Indexes of the tags that a coalesced read was for, either one
+    tag or the members/elements read with it
+    """
+    if isinstance(owner, int):
+        return [owner]
+    return [member[0] for member in owner[1]]
@@ -0,0 +1,104 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import sys
+
+from array import array
+from itertools import chain
+from struct import calcsize
+
+# numpy is optional, without it arrays are returned as array.array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def unpack_array(fmt, data, offset, count):
+    """
+    Unpack count values of a struct format from data in one go.
+    Returns a numpy.ndarray when numpy is installed, otherwise an
+    array.array, or None if the format has no array equivalent
+    """
+    code = fmt[-1]
+    size = calcsize('<' + code)
+    if numpy is not None:
+        values = numpy.frombuffer(data, numpy.dtype('<' + code), count, offset)
+        if not values.flags.writeable:
+            # don't hand out a view of a read only reply
+            values = values.copy()
+        return values
+
+    # array.array uses the platform's sizes and byte order,
+    # the PLC always sends little endian
+    if code not in 'bBhHiIlLqQfd' or array(code).itemsize != size:
+        return None
+    values = array(code)
+    values.frombytes(memoryview(data)[offset:offset + count * size])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def unpack_records(codec, data, offset, count, size):
+    """
+    Unpack count UDT's, size bytes apart, into a numpy structured
+    array with the dtype of their structure object, fields are views
+    of the one buffer.  Returns None without numpy or when the dtype
+    doesn't match the size of the UDT
+    """
+    if numpy is None:
+        return None
+    dtype = codec.dtype()
+    if dtype.itemsize != size:
+        return None
+    values = numpy.frombuffer(data, dtype, count, offset)
+    if not values.flags.writeable:
+        values = values.copy()
+    return values
+
+
+# the bits of every possible byte, least significant first
+_byte_bits = [tuple(bool(byte >> bit & 1) for bit in range(8)) for byte in range(256)]
+
+
+def unpack_bits(data, offset, start, count, as_array=False):
+    """
+    Unpack count bits, starting at bit start of the little endian
+    words in data.  Whole bytes are looked up rather than each bit
+    being masked.  Returns a list of True/False, or a numpy array
+    of bools when as_array is set and numpy is installed
+    """
+    first = offset + start // 8
+    last = offset + (start + count + 7) // 8
+    shift = start % 8
+
+    if as_array and numpy is not None:
+        raw = numpy.frombuffer(data, numpy.uint8, last - first, first)
+        return numpy.unpackbits(raw, bitorder='little')[shift:shift + count].astype(bool)
+
+    bits = list(chain.from_iterable(map(_byte_bits.__getitem__, data[first:last])))
+    return bits[shift:shift + count]
+
+
+def pack_bits(data, offset, start, count):
+    """
+    Return count bits, starting at bit start of the little endian
+    words in data, packed in an int where bit 0 is the first bit
+    """
+    first = offset + start // 8
+    last = offset + (start + count + 7) // 8
+    value = int.from_bytes(bytes(data[first:last]), 'little')
+    return (value >> (start % 8)) & ((1 << count) - 1)
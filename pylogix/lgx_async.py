@@ -0,0 +1,332 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import asyncio
+
+from .eip import PLC
+from .lgx_comm import Connection
+from .lgx_device import Device
+from .lgx_response import Response
+from struct import unpack_from
+
+
+class AsyncConnection(Connection):
+    """
+    asyncio version of Connection.  Packets are built and parsed by
+    Connection, only the socket handling is replaced with asyncio streams
+    """
+
+    def __init__(self, parent):
+        super(AsyncConnection, self).__init__(parent)
+        # asyncio streams are used instead of the socket
+        self.Socket.close()
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    async def connect(self, connected=True, conn_class=3):
+        """
+        Connect to the PLC
+        """
+        return await self._connect(connected, conn_class)
+
+    async def send(self, request, connected=True, slot=None):
+        """
+        Send the request to the PLC
+        Return the status and data
+        """
+        return await self._getBytes(self._buildFrame(request, connected, slot), connected)
+
+    async def send_many(self, requests, ordered=False):
+        """
+        Send several connected requests, spread across the parent's
+        number of Connections unless they are ordered, see
+        Connection.send_many().
+        Return a list of status and data, in the order of the requests
+        """
+        count = min(max(1, self.parent.Connections), len(requests))
+        if ordered or count < 2:
+            return await self._send_many(requests)
+
+        while len(self._stripes) < count - 1:
+            self._stripes.append(AsyncConnection(self.parent))
+        parts = await asyncio.gather(
+            self._send_many(requests[0::count]),
+            *[stripe._send_stripe(requests[i::count], self.ConnectionSize, self.Port)
+              for i, stripe in enumerate(self._stripes[:count-1], 1)])
+        results = [None] * len(requests)
+        for i, part in enumerate(parts):
+            if part is None:
+                # the extra connection couldn't be opened, use this one
+                part = await self._send_many(requests[i::count])
+            results[i::count] = part
+        return results
+
+    async def _send_many(self, requests):
+        """
+        Send several connected requests, keeping up to the parent's
+        PipelineDepth of them in flight at a time.  Replies are matched
+        to their request by the sequence count.
+        Return a list of status and data, in the order of the requests
+        """
+        depth = max(1, self.parent.PipelineDepth)
+        results = [(1, None)] * len(requests)
+        pending = {}
+        sent = 0
+        try:
+            while sent < len(requests) or pending:
+                while sent < len(requests) and len(pending) < depth:
+                    frame = self._buildEIPHeader(requests[sent])
+                    pending[unpack_from('<H', frame, 44)[0]] = sent
+                    self._writer.write(frame)
+                    sent += 1
+                await self._writer.drain()
+                ret_data = await self.recv_data()
+                index = pending.pop(unpack_from('<H', ret_data, 44)[0], None)
+                if index is not None:
+                    status = unpack_from('<B', ret_data, 48)[0]
+                    results[index] = (status, ret_data)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+            self.SocketConnected = False
+            results = [r if r[1] else (7, None) for r in results]
+        return results
+
+    async def run(self, operation):
+        """
+        Run an operation (generator) until it completes and return
+        its result.  Only one operation can use the connection at a
+        time, others will wait their turn.
+        """
+        async with self._get_lock():
+            result = None
+            while True:
+                try:
+                    call = operation.send(result)
+                except StopIteration as e:
+                    return e.value
+                result = await getattr(self, call[0])(*call[1:])
+
+    async def stream(self, operation):
+        """
+        Run an operation that hands out results along the way, as an
+        async generator.  The connection is only held while the
+        operation talks to the PLC
+        """
+        while True:
+            async with self._get_lock():
+                result = None
+                while True:
+                    try:
+                        call = operation.send(result)
+                    except StopIteration:
+                        return
+                    if call[0] == 'result':
+                        break
+                    result = await getattr(self, call[0])(*call[1:])
+            yield call[1]
+
+    async def close(self):
+        """
+        Close the connection
+        """
+        async with self._get_lock():
+            await self._closeConnection()
+            for stripe in self._stripes:
+                await stripe._closeConnection()
+            self._stripes = []
+
+    async def _send_stripe(self, requests, connection_size, port):
+        """
+        Send a share of a batch on an extra connection, see
+        Connection._send_stripe()
+        """
+        if self.ConnectionSize != connection_size or self.Port != port:
+            await self._closeConnection()
+            self.ConnectionSize = connection_size
+            self.Port = port
+        ret = await self._connect(True, 3)
+        if not ret[0]:
+            return None
+        return await self._send_many(requests)
+
+    def _get_lock(self):
+        """
+        Create the lock when first needed so that it belongs to the
+        running event loop
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _connect(self, connected, conn_class):
+        """
+        Open a connection to the PLC.
+        """
+        if self.SocketConnected:
+            if connected and not self._connected:
+                # connection type changed, need to close so we can reconnect
+                await self._closeConnection()
+            elif not connected and self._connected:
+                # connection type changed, need to close so we can reconnect
+                await self._closeConnection()
+            else:
+                return (True, 'Success')
+
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.parent.IPAddress, self.Port),
+                self.parent.SocketTimeout)
+        except (asyncio.TimeoutError, OSError) as e:
+            self.SocketConnected = False
+            self.SequenceCounter = 1
+            return (False, e)
+
+        # register the session
+        self._writer.write(self._buildRegisterSession())
+        ret_data = await self.recv_data()
+        if ret_data:
+            self.SessionHandle = unpack_from('<I', ret_data, 4)[0]
+            self._registered = True
+        else:
+            self.SocketConnected = False
+            return (False, 'Register session failed')
+
+        if connected:
+            if self.ConnectionSize is not None:
+                ret = await self._forward_open()
+            else:
+                # try a large forward open by default
+                self.ConnectionSize = 4002
+                ret = await self._forward_open()
+
+                # if large forward open fails, try a normal forward open
+                if not ret[0]:
+                    self.ConnectionSize = 504
+                    ret = await self._forward_open()
+
+            return ret
+
+        self.SocketConnected = True
+        return (self.SocketConnected, 'Success')
+
+    async def _closeConnection(self):
+        """
+        Close the connection to the PLC (forward close, unregister session)
+        """
+        self.SocketConnected = False
+        if not self._writer:
+            return
+        try:
+            if self._connected:
+                self._writer.write(self._buildForwardClosePacket())
+                await self.recv_data()
+                self._connected = False
+            if self._registered:
+                self._writer.write(self._buildUnregisterSession())
+                await self._writer.drain()
+        except Exception:
+            pass
+        finally:
+            self._writer.close()
+            self._writer = None
+
+    async def _getBytes(self, data, connected):
+        """
+        Sends data and gets the return data
+        """
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+            ret_data = await self.recv_data()
+            if ret_data:
+                if connected:
+                    status = unpack_from('<B', ret_data, 48)[0]
+                else:
+                    status = unpack_from('<B', ret_data, 42)[0]
+                return status, ret_data
+            else:
+                return 1, None
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+            self.SocketConnected = False
+            return 7, None
+
+    async def _forward_open(self):
+        """
+        ForwardOpen connection.
+        """
+        self._writer.write(self._buildForwardOpenPacket())
+        try:
+            ret_data = await self.recv_data()
+        except asyncio.TimeoutError as e:
+            return (False, e)
+        return self._parseForwardOpen(ret_data)
+
+    async def recv_data(self):
+        """
+        Read the encapsulation header, which contains the length of
+        the payload, then read the rest of the payload
+        """
+        timeout = self.parent.SocketTimeout
+        header = await asyncio.wait_for(self._reader.readexactly(24), timeout)
+        payload_len = unpack_from('<H', header, 2)[0]
+        payload = await asyncio.wait_for(self._reader.readexactly(payload_len), timeout)
+        return header + payload
+
+
+class AsyncPLC(PLC):
+    """
+    asyncio version of PLC.  It has the same properties and methods
+    as PLC, but each method has to be awaited:
+
+    async with AsyncPLC("192.168.1.10") as comm:
+        ret = await comm.Read("MyTag")
+
+    Requests made to one AsyncPLC are sent one at a time, use one
+    AsyncPLC per controller to talk to many controllers at once.
+    """
+
+    def __init__(self, ip_address="", slot=0, timeout=5.0, Micro800=False):
+        super(AsyncPLC, self).__init__(ip_address, slot, timeout, Micro800)
+        self.conn.close()
+        self.conn = AsyncConnection(self)
+
+    def __enter__(self):
+        raise TypeError("use 'async with' with AsyncPLC")
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """
+        Clean up on exit
+        """
+        await self.conn.close()
+
+    async def Discover(self):
+        """
+        Query all the EIP devices on the network
+
+        returns Response class (.TagName, .Value, .Status)
+        """
+        loop = asyncio.get_running_loop()
+        devices = await loop.run_in_executor(None, self.conn.discover, Device.parse)
+        return Response(None, devices, 0)
@@ -0,0 +1,108 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import os
+
+from .lgx_tag import Tag, UDT
+
+# files written with a different version are ignored
+VERSION = 2
+
+
+def cache_path(directory, key, all_tags):
+    """
+    File the tag list of a controller is cached in, the controller
+    scope and the full tag list are kept apart
+    """
+    if all_tags:
+        return os.path.join(directory, '{}.json'.format(key))
+    return os.path.join(directory, '{}-controller.json'.format(key))
+
+
+def load(path, signature):
+    """
+    Load a cached tag list.  Returns the tags, the UDT's by type
+    and the program names, or None when there is no cache or the
+    controller has changed since it was saved
+    """
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if cache.get('version') != VERSION or cache.get('signature') != signature:
+        return None
+
+    udts = {}
+    for u in cache['udts']:
+        udt = UDT()
+        udt.Type = u['Type']
+        udt.Name = u['Name']
+        udt.Handle = u['Handle']
+        udt.Size = u['Size']
+        for f in u['Fields']:
+            field = _load_tag(f)
+            field.UDT = udt
+            udt.Fields.append(field)
+            udt.FieldsByName[field.TagName] = field
+        udts[udt.Type] = udt
+
+    tags = [_load_tag(t) for t in cache['tags']]
+    return tags, udts, cache['programs']
+
+
+def save(path, signature, tags, udts, programs):
+    """
+    Save the tag list, written to a temporary file first so
+    a reader never sees half of it
+    """
+    cache = {'version': VERSION,
+             'signature': signature,
+             'programs': programs,
+             'tags': [_dump_tag(t) for t in tags],
+             'udts': [{'Type': u.Type,
+                       'Name': u.Name,
+                       'Handle': u.Handle,
+                       'Size': u.Size,
+                       'Fields': [_dump_tag(f) for f in u.Fields]} for u in udts.values()]}
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(temp, path)
+
+
+def _dump_tag(tag):
+    """
+    Tag properties as a dict, the raw bytes are stored as hex
+    """
+    values = dict((k, getattr(tag, k)) for k in Tag.__slots__ if k != 'UDT')
+    if values.get('Bytes') is not None:
+        values['Bytes'] = bytes(values['Bytes']).hex()
+    return values
+
+
+def _load_tag(values):
+    tag = Tag()
+    for k, v in values.items():
+        setattr(tag, k, v)
+    if tag.Bytes is not None:
+        tag.Bytes = bytes.fromhex(tag.Bytes)
+    return tag
@@ -0,0 +1,308 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Write a Python module with a class for every UDT in a PLC, so a
+program can decode them without uploading the templates each time
+it starts:
+
+python -m pylogix.lgx_codegen 192.168.1.10 plc_types.py
+"""
+import argparse
+import keyword
+import sys
+
+from datetime import datetime
+from .eip import PLC
+from .udt import from_template
+from .udt.lgx_udt import ARRAY, BasicType, BOOL_ARRAY, BOOLS, BYTES, SPARE, STRING, UDT
+
+_HEADER = '''"""
+UDT's of {source}, generated by pylogix.lgx_codegen on {date}.
+Decode a UDT read with pylogix: Motor.unpack(comm.Read("Motor1").Value)
+and write it back with comm.Write("Motor1", motor.pack())
+"""
+from struct import Struct as _Struct
+
+_ENCODING = {encoding!r}
+
+
+def _string(length, data):
+    return data[:length].decode(_ENCODING)
+
+
+def _pack_string(value, length):
+    data = value.encode(_ENCODING)[:length]
+    return [len(data), data]
+
+
+def _bits(words, length):
+    return [word & (1 << bit) != 0 for word in words for bit in range(32)][:length]
+
+
+def _pack_bits(values, words):
+    packed = [0] * words
+    for i, value in enumerate(values[:words * 32]):
+        if value:
+            packed[i // 32] |= 1 << (i % 32)
+    return packed
+
+
+class _UDT(object):
+    __slots__ = ()
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        """
+        Decode the bytes the PLC returns for the UDT
+        """
+        return cls._from_values(cls._struct.unpack_from(data, offset), 0)
+
+    @classmethod
+    def unpack_many(cls, data, count, offset=0):
+        """
+        Decode an array of the UDT
+        """
+        view = memoryview(data)[offset:offset + count * cls._struct.size]
+        return [cls._from_values(values, 0) for values in cls._struct.iter_unpack(view)]
+
+    def pack(self):
+        """
+        The bytes the PLC expects for the UDT
+        """
+        return self._struct.pack(*self._values())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __repr__(self):
+        members = ', '.join('{{}}={{!r}}'.format(n, getattr(self, n)) for n in self.__slots__)
+        return '{{}}({{}})'.format(type(self).__name__, members)
+'''
+
+
+def generate(udts, tags=(), encoding='utf-8', source='the PLC'):
+    """
+    Python source of a module with a class for every UDT, along with
+    a manifest of the tags and their data types
+    :param udts: the UDT definitions, PLC.UDT after PLC.GetTagList()
+    :param tags: the tags for the manifest, PLC.TagList
+    :param encoding: what encoding to use for strings
+    :param source: where the definitions came from, for the docstring
+    """
+    codecs = {}
+    for udt in udts.values():
+        try:
+            from_template(udt, udts, encoding, codecs)
+        except ValueError:
+            # a member's UDT isn't known, leave it out
+            pass
+
+    names = {}
+    for udt in udts.values():
+        if isinstance(codecs.get(udt.Type), UDT):
+            names[id(codecs[udt.Type])] = _identifier(udt.Name)
+
+    lines = [_HEADER.format(source=source, date=datetime.now().strftime('%Y-%m-%d %H:%M'), encoding=encoding)]
+    done = set()
+    for udt in sorted(udts.values(), key=lambda u: u.Name):
+        if id(codecs.get(udt.Type)) in names:
+            _write_class(lines, codecs[udt.Type], udt, udts, names, done)
+
+    lines.append('')
+    lines.append('# UDT classes by the name of the UDT')
+    lines.append('UDTS = {')
+    for udt in sorted(udts.values(), key=lambda u: u.Name):
+        if id(codecs.get(udt.Type)) in names:
+            lines.append('    {!r}: {},'.format(udt.Name, names[id(codecs[udt.Type])]))
+    lines.append('}')
+
+    lines.append('')
+    lines.append('# tag name: (data type, array size), the data type is a UDT class or the name of the type')
+    lines.append('TAGS = {')
+    for tag in tags:
+        if not tag.DataType:
+            continue
+        codec = codecs.get(tag.DataTypeValue) if tag.Struct else None
+        data_type = names.get(id(codec), repr(tag.DataType))
+        lines.append('    {!r}: ({}, {}),'.format(tag.TagName, data_type, tag.Size or 1))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_class(lines, codec, udt, udts, names, done):
+    """
+    Add the class of a UDT, after the classes of its members
+    """
+    if id(codec) in done:
+        return
+    done.add(id(codec))
+    for k, v in codec.structure_def:
+        while isinstance(v, ARRAY):
+            v = v.data_type
+        if id(v) in names:
+            _write_class(lines, v, None, udts, names, done)
+
+    attributes = []
+    defaults = []
+    unpack = []
+    pack = []
+    index = 0
+    for k, v in codec.structure_def:
+        count = v.compile_unpack(0)[1]
+        if k is None and isinstance(v, BOOLS):
+            # BOOL members, packed into bytes
+            bits = [[] for i in range(v.length)]
+            for bitpos, bitname in enumerate(v.BitNames):
+                if bitname != '':
+                    attr = _identifier(bitname)
+                    attributes.append(attr)
+                    defaults.append('self.{} = False'.format(attr))
+                    unpack.append('self.{} = v[i + {}] & {} != 0'.format(
+                        attr, index + bitpos // v.bitlen, 1 << bitpos % v.bitlen))
+                    bits[bitpos // v.bitlen].append('bool(self.{}) << {}'.format(attr, bitpos % v.bitlen))
+            for byte in bits:
+                pack.append('values.append({})'.format(' | '.join(byte) or '0'))
+        elif k is not None and not isinstance(v, SPARE):
+            attr = _identifier(k)
+            attributes.append(attr)
+            defaults.append('self.{} = {}'.format(attr, _default(v, names)))
+            unpack.append('self.{} = {}'.format(attr, _unpack(v, 'i + {}'.format(index), names)))
+            pack += _pack(v, 'self.' + attr, names)
+        index += count
+
+    name = names[id(codec)]
+    lines.append('')
+    lines.append('class {}(_UDT):'.format(name))
+    lines.append('    __slots__ = {!r}'.format(tuple(attributes)))
+    lines.append('    _struct = _Struct({!r})'.format('<' + codec.format.lstrip('@=<>!')))
+    if udt is None:
+        udt = [u for u in udts.values() if _identifier(u.Name) == name][0]
+    lines.append('    _handle = {}'.format(hex(udt.Handle)))
+    lines.append('')
+    lines.append('    def __init__(self, **members):')
+    lines += ['        ' + d for d in defaults]
+    lines.append('        for name, value in members.items():')
+    lines.append('            setattr(self, name, value)')
+    lines.append('')
+    lines.append('    @classmethod')
+    lines.append('    def _from_values(cls, v, i):')
+    lines.append('        self = cls.__new__(cls)')
+    lines += ['        ' + u for u in unpack]
+    lines.append('        return self')
+    lines.append('')
+    lines.append('    def _values(self):')
+    lines.append('        values = []')
+    lines += ['        ' + p for p in pack]
+    lines.append('        return values')
+    lines.append('')
+
+
+# names the generated module and classes use themselves
+_RESERVED = {'_Struct', '_ENCODING', '_string', '_pack_string', '_bits', '_pack_bits', '_UDT', 'UDTS', 'TAGS',
+             '_struct', '_handle', 'unpack', 'unpack_many', 'pack', '_from_values', '_values'}
+
+
+def _identifier(name):
+    """
+    PLC names are valid identifiers, unless they are a python keyword
+    or a name the generated code already uses
+    """
+    if keyword.iskeyword(name) or name in _RESERVED:
+        return name + '_'
+    return name
+
+
+def _default(data_type, names):
+    if isinstance(data_type, BasicType):
+        if data_type.format == '?':
+            return 'False'
+        return '0.0' if data_type.format in 'fd' else '0'
+    elif isinstance(data_type, BYTES):
+        return 'bytes({})'.format(data_type.length)
+    elif isinstance(data_type, STRING):
+        return "''"
+    elif isinstance(data_type, BOOL_ARRAY):
+        return '[False] * {}'.format(data_type.length)
+    elif isinstance(data_type, ARRAY):
+        if isinstance(data_type.data_type, (BasicType, BYTES)):
+            return '[{}] * {}'.format(_default(data_type.data_type, names), data_type.length)
+        return '[{} for n in range({})]'.format(_default(data_type.data_type, names), data_type.length)
+    return '{}()'.format(names[id(data_type)])
+
+
+def _unpack(data_type, index, names):
+    """
+    Expression that takes the value out of the unpacked values v,
+    starting at index
+    """
+    if isinstance(data_type, (BasicType, BYTES)):
+        return 'v[{}]'.format(index)
+    elif isinstance(data_type, STRING):
+        return '_string(v[{0}], v[{0} + 1])'.format(index)
+    elif isinstance(data_type, BOOL_ARRAY):
+        return '_bits(v[{0}:{0} + {1}], {2})'.format(index, data_type.words, data_type.length)
+    elif isinstance(data_type, ARRAY):
+        element = data_type.data_type
+        if isinstance(element, (BasicType, BYTES)):
+            return 'list(v[{0}:{0} + {1}])'.format(index, data_type.length)
+        count = element.compile_unpack(0)[1]
+        item = _unpack(element, '{} + n * {}'.format(index, count), names)
+        return '[{} for n in range({})]'.format(item, data_type.length)
+    return '{}._from_values(v, {})'.format(names[id(data_type)], index)
+
+
+def _pack(data_type, value, names, indent=''):
+    """
+    Statements that add the value to the list of values to pack
+    """
+    if isinstance(data_type, (BasicType, BYTES)):
+        return [indent + 'values.append({})'.format(value)]
+    elif isinstance(data_type, STRING):
+        return [indent + 'values += _pack_string({}, {})'.format(value, data_type.length)]
+    elif isinstance(data_type, BOOL_ARRAY):
+        return [indent + 'values += _pack_bits({}, {})'.format(value, data_type.words)]
+    elif isinstance(data_type, ARRAY):
+        if isinstance(data_type.data_type, (BasicType, BYTES)):
+            return [indent + 'values += {}'.format(value)]
+        return ([indent + 'for item in {}:'.format(value)] +
+                _pack(data_type.data_type, 'item', names, indent + '    '))
+    return [indent + 'values += {}._values()'.format(value)]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Write a Python module with a class for every UDT in a PLC')
+    parser.add_argument('ip_address', help='IP address of the PLC')
+    parser.add_argument('output', nargs='?', help='file to write the module to, standard output by default')
+    parser.add_argument('--slot', type=int, default=0, help='slot the PLC is in (default 0)')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of strings (default utf-8)')
+    args = parser.parse_args(args)
+
+    with PLC(args.ip_address, args.slot) as comm:
+        ret = comm.GetTagList()
+        if ret.Value is None:
+            sys.stderr.write('Failed to get the tag list: {}\n'.format(ret.Status))
+            return 1
+        source = generate(comm.UDT, comm.TagList, args.encoding, args.ip_address)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,7 +15,10 @@
 """
 import pylogix
 import socket
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from .lgx_packet import connected_frame, unconnected_frame
 from random import randrange
 from struct import pack, unpack_from
 
@@ -40,6 +43,11 @@ class Connection(object):
         self.OriginatorSerialNumber = 42
         self.SequenceCounter = 1
         self.ConnectionSize = None # Default to try Large, then Small Fwd Open.
+        self._lock = threading.Lock()
+
+        # extra connections that batches are spread across, see send_many()
+        self._stripes = []
+        self._executor = None
 
     def connect(self, connected=True, conn_class=3):
         """
@@ -52,23 +60,147 @@ class Connection(object):
         Send the request to the PLC
         Return the status and data
         """
-        if connected:
-            eip_header = self._buildEIPHeader(request)
-        else:
-            if self.parent.Route or slot is not None:
-                path = self._unconnectedPath(slot)
-                frame = self._buildCIPUnconnectedSend(len(request)) + request + path
-            else:
-                frame = request
-            eip_header = self._buildEIPSendRRDataHeader(len(frame)) + frame
-        
-        return self._getBytes(eip_header, connected)
+        return self._getBytes(self._buildFrame(request, connected, slot), connected)
+
+    def send_many(self, requests, ordered=False):
+        """
+        Send several connected requests.  With the parent's Connections
+        set above 1, they are spread across that many connections (each
+        its own session) and sent in parallel, unless they are ordered,
+        ex: fragments of one write, which have to arrive one after the
+        other.  Extra connections are opened when first needed.
+        Return a list of status and data, in the order of the requests
+        """
+        count = min(max(1, self.parent.Connections), len(requests))
+        if ordered or count < 2:
+            return self._send_many(requests)
+
+        self._add_stripes(count - 1)
+        futures = [self._executor.submit(stripe._send_stripe, requests[i::count],
+                                         self.ConnectionSize, self.Port)
+                   for i, stripe in enumerate(self._stripes[:count-1], 1)]
+        results = [None] * len(requests)
+        results[0::count] = self._send_many(requests[0::count])
+        for i, future in enumerate(futures, 1):
+            part = future.result()
+            if part is None:
+                # the extra connection couldn't be opened, use this one
+                part = self._send_many(requests[i::count])
+            results[i::count] = part
+        return results
+
+    def _send_many(self, requests):
+        """
+        Send several connected requests, keeping up to the parent's
+        PipelineDepth of them in flight at a time.  Replies are matched
+        to their request by the sequence count.
+        Return a list of status and data, in the order of the requests
+        """
+        depth = max(1, self.parent.PipelineDepth)
+        results = [(1, None)] * len(requests)
+        pending = {}
+        sent = 0
+        try:
+            while sent < len(requests) or pending:
+                while sent < len(requests) and len(pending) < depth:
+                    frame = self._buildEIPHeader(requests[sent])
+                    pending[unpack_from('<H', frame, 44)[0]] = sent
+                    self.Socket.send(frame)
+                    sent += 1
+                ret_data = self.recv_data()
+                index = pending.pop(unpack_from('<H', ret_data, 44)[0], None)
+                if index is not None:
+                    status = unpack_from('<B', ret_data, 48)[0]
+                    results[index] = (status, ret_data)
+        except (socket.gaierror):
+            self.SocketConnected = False
+        except (IOError):
+            self.SocketConnected = False
+            results = [r if r[1] else (7, None) for r in results]
+        return results
+
+    def run(self, operation):
+        """
+        Run an operation (generator) until it completes and return
+        its result.  Each time the operation needs to talk to the PLC,
+        it yields a tuple of the connection method name and arguments,
+        ex: ('send', request), the result is sent back to the operation.
+        Only one operation can use the connection at a time, so a PLC
+        can be shared between threads.
+        """
+        with self._lock:
+            result = None
+            while True:
+                try:
+                    call = operation.send(result)
+                except StopIteration as e:
+                    return e.value
+                result = getattr(self, call[0])(*call[1:])
+
+    def stream(self, operation):
+        """
+        Run an operation that hands out results along the way, each
+        ('result', value) it yields is passed on to the caller.  The
+        connection is only held while the operation talks to the PLC,
+        other threads can use it while the caller handles a result
+        """
+        while True:
+            with self._lock:
+                result = None
+                while True:
+                    try:
+                        call = operation.send(result)
+                    except StopIteration:
+                        return
+                    if call[0] == 'result':
+                        break
+                    result = getattr(self, call[0])(*call[1:])
+            yield call[1]
 
     def close(self):
         """
         Close the connection
         """
-        self._closeConnection()
+        with self._lock:
+            self._closeConnection()
+            for stripe in self._stripes:
+                stripe._closeConnection()
+            self._stripes = []
+            if self._executor:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _add_stripes(self, count):
+        """
+        Make sure there are at least count extra connections
+        """
+        if len(self._stripes) < count:
+            self._stripes += [self._new_stripe() for i in range(count - len(self._stripes))]
+            if self._executor:
+                self._executor.shutdown(False)
+            self._executor = ThreadPoolExecutor(len(self._stripes))
+
+    def _new_stripe(self):
+        """
+        An extra connection to the same PLC
+        """
+        return Connection(self.parent)
+
+    def _send_stripe(self, requests, connection_size, port):
+        """
+        Send a share of a batch on an extra connection, opening it
+        first if needed.  The requests were built for the size of the
+        main connection, so the extra one has to be the same size, and
+        it goes to the same port.
+        Returns None if the connection can't be opened
+        """
+        if self.ConnectionSize != connection_size or self.Port != port:
+            self._closeConnection()
+            self.ConnectionSize = connection_size
+            self.Port = port
+        if not self._connect(True, 3)[0]:
+            return None
+        return self._send_many(requests)
 
     def _connect(self, connected, conn_class):
         """
@@ -89,6 +221,9 @@ class Connection(object):
             except: pass
             self.Socket = socket.socket()
             self.Socket.settimeout(self.parent.SocketTimeout)
+            # pipelined requests go out back to back, don't let them
+            # wait on the ACK of the one before
+            self.Socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.Socket.connect((self.parent.IPAddress, self.Port))
         except socket.error as e:
             self.SocketConnected = False
@@ -107,23 +242,42 @@ class Connection(object):
             return (False, 'Register session failed')
 
         if connected:
-            if self.ConnectionSize is not None:
-                ret = self._forward_open()
-            else:
-                # try a large forward open by default
-                self.ConnectionSize = 4002
-                ret = self._forward_open()
-
-                # if large forward open fails, try a normal forward open
-                if not ret[0]:
-                    self.ConnectionSize = 504
-                    ret = self._forward_open()
-
-            return ret
+            return self._open_connection()
 
         self.SocketConnected = True
         return (self.SocketConnected, 'Success')
 
+    def _open_connection(self):
+        """
+        Forward open with the connection size that was set, or the
+        largest one the PLC accepts
+        """
+        if self.ConnectionSize is not None:
+            return self._forward_open()
+
+        # try a large forward open by default
+        self.ConnectionSize = 4002
+        ret = self._forward_open()
+
+        # if large forward open fails, try a normal forward open
+        if not ret[0]:
+            self.ConnectionSize = 504
+            ret = self._forward_open()
+        return ret
+
+    def _buildFrame(self, request, connected, slot):
+        """
+        Wrap the request in the EIP header, connected or unconnected
+        """
+        if connected:
+            return self._buildEIPHeader(request)
+
+        if self.parent.Route or slot is not None:
+            path = self._unconnectedPath(slot)
+        else:
+            path = None
+        return unconnected_frame(self.SessionHandle, self.Context, request, path)
+
     def _closeConnection(self):
         """
         Close the connection to the PLC (forward close, unregister session)
@@ -170,21 +324,33 @@ class Connection(object):
         """
         When receiving data from the socket, it is possible to receive
         incomplete data.  The initial packet that comes in contains
-        the length of the payload.  We can use that to keep calling
-        recv() until the entire payload is received.  This only happnens
-        when using LargeForwardOpen
+        the length of the payload.  We can use that to allocate the
+        whole packet once, then keep calling recv_into() until the
+        entire payload is received.  This only happnens when using
+        LargeForwardOpen
         """
-        data = b''
-        part = self.Socket.recv(4096)
-        payload_len = unpack_from('<H', part, 2)[0]
-        data += part
+        header = bytearray(24)
+        self._recv_into(memoryview(header))
+        payload_len = unpack_from('<H', header, 2)[0]
 
-        while len(data)-24 < payload_len:
-            part = self.Socket.recv(4096)
-            data += part
+        data = bytearray(24 + payload_len)
+        data[:24] = header
+        self._recv_into(memoryview(data)[24:])
 
         return data
 
+    def _recv_into(self, view):
+        """
+        Fill the view from the socket.  Never read past the end of the
+        current packet, the next reply may already be waiting when
+        requests are pipelined
+        """
+        while len(view):
+            received = self.Socket.recv_into(view)
+            if not received:
+                raise socket.error('Connection closed by the remote host')
+            view = view[received:]
+
     def _buildRegisterSession(self):
         """
         Register our CIP connection
@@ -237,6 +403,12 @@ class Connection(object):
             ret_data = self.recv_data()
         except socket.timeout as e:
             return (False, e)
+        return self._parseForwardOpen(ret_data)
+
+    def _parseForwardOpen(self, ret_data):
+        """
+        Get the connection ID from the forward open reply
+        """
         sts = unpack_from('<b', ret_data, 42)[0]
         if not sts:
             self.OTNetworkConnectionID = unpack_from('<I', ret_data, 44)[0]
@@ -253,8 +425,7 @@ class Connection(object):
         Assemble the forward open packet
         """
         forwardOpen = self._buildCIPForwardOpen()
-        rrDataHeader = self._buildEIPSendRRDataHeader(len(forwardOpen))
-        return rrDataHeader+forwardOpen
+        return unconnected_frame(self.SessionHandle, self.Context, forwardOpen)
 
     def _buildCIPForwardOpen(self):
         """
@@ -271,7 +442,7 @@ class Connection(object):
         CIPPriority = 0x0A
         CIPTimeoutTicks = 0x0e
         CIPOTConnectionID = 0x20000002
-        CIPTOConnectionID = randrange(65000)
+        CIPTOConnectionID = self._new_connection_id()
         self.SerialNumber = randrange(65000)
         CIPConnectionSerialNumber = self.SerialNumber
         CIPVendorID = self.VendorID
@@ -325,13 +496,19 @@ class Connection(object):
         connection_path += path
         return ForwardOpen + connection_path
 
+    def _new_connection_id(self):
+        """
+        The connection ID the PLC puts on its replies, picked
+        for each forward open
+        """
+        return randrange(65000)
+
     def _buildForwardClosePacket(self):
         """
         Assemble the forward close packet
         """
         forwardClose = self._buildForwardClose()
-        rrDataHeader = self._buildEIPSendRRDataHeader(len(forwardClose))
-        return rrDataHeader + forwardClose
+        return unconnected_frame(self.SessionHandle, self.Context, forwardClose)
 
     def _buildForwardClose(self):
         """
@@ -369,67 +546,6 @@ class Connection(object):
         connection_path += path
         return ForwardClose + connection_path
 
-    def _buildEIPSendRRDataHeader(self, frameLen):
-        """
-        Build the EIP Send RR Data Header
-        """
-        EIPCommand = 0x6F
-        EIPLength = 16+frameLen
-        EIPSessionHandle = self.SessionHandle
-        EIPStatus = 0x00
-        EIPContext = self.Context
-        EIPOptions = 0x00
-
-        EIPInterfaceHandle = 0x00
-        EIPTimeout = 0x00
-        EIPItemCount = 0x02
-        EIPItem1Type = 0x00
-        EIPItem1Length = 0x00
-        EIPItem2Type = 0xB2
-        EIPItem2Length = frameLen
-
-        return pack('<HHIIQIIHHHHHH',
-                    EIPCommand,
-                    EIPLength,
-                    EIPSessionHandle,
-                    EIPStatus,
-                    EIPContext,
-                    EIPOptions,
-                    EIPInterfaceHandle,
-                    EIPTimeout,
-                    EIPItemCount,
-                    EIPItem1Type,
-                    EIPItem1Length,
-                    EIPItem2Type,
-                    EIPItem2Length)
-
-    def _buildCIPUnconnectedSend(self, service_size):
-        """
-        build unconnected send to request tag database
-        """
-        CIPService = 0x52
-        CIPPathSize = 0x02
-        CIPClassType = 0x20
-
-        CIPClass = 0x06
-        CIPInstanceType = 0x24
-
-        CIPInstance = 0x01
-        CIPPriority = 0x0A
-        CIPTimeoutTicks = 0x0e
-        ServiceSize = service_size
-
-        return pack('<BBBBBBBBH',
-                    CIPService,
-                    CIPPathSize,
-                    CIPClassType,
-                    CIPClass,
-                    CIPInstanceType,
-                    CIPInstance,
-                    CIPPriority,
-                    CIPTimeoutTicks,
-                    ServiceSize)
-
     def _buildEIPHeader(self, ioi):
         """
         The EIP Header contains the tagIOI and the
@@ -439,45 +555,18 @@ class Connection(object):
         if self.ContextPointer == 155:
             self.ContextPointer = 0
 
-        EIPPayloadLength = 22+len(ioi)
-        EIPConnectedDataLength = len(ioi)+2
-
-        EIPCommand = 0x70
-        EIPLength = 22 + len(ioi)
-        EIPSessionHandle = self.SessionHandle
-        EIPStatus = 0x00
         EIPContext = context_dict[self.ContextPointer]
         self.ContextPointer += 1
 
-        EIPOptions = 0x0000
-        EIPInterfaceHandle = 0x00
-        EIPTimeout = 0x00
-        EIPItemCount = 0x02
-        EIPItem1ID = 0xA1
-        EIPItem1Length = 0x04
-        EIPItem1 = self.OTNetworkConnectionID
-        EIPItem2ID = 0xB1
-        EIPItem2Length = EIPConnectedDataLength
         EIPSequence = self.SequenceCounter
         self.SequenceCounter += 1
         self.SequenceCounter = self.SequenceCounter % 0x10000
 
-        EIPHeaderFrame = pack('<HHIIQIIHHHHIHHH',
-                              EIPCommand,
-                              EIPLength,
-                              EIPSessionHandle,
-                              EIPStatus,
-                              EIPContext,
-                              EIPOptions,
-                              EIPInterfaceHandle,
-                              EIPTimeout,
-                              EIPItemCount,
-                              EIPItem1ID,
-                              EIPItem1Length,
-                              EIPItem1,
-                              EIPItem2ID, EIPItem2Length, EIPSequence)
-
-        return EIPHeaderFrame+ioi
+        return connected_frame(self.SessionHandle,
+                               EIPContext,
+                               self.OTNetworkConnectionID,
+                               EIPSequence,
+                               ioi)
 
     def _connectedPath(self):
         """
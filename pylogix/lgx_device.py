@@ -18,6 +18,9 @@ import socket
 from struct import pack, unpack_from
 
 class Device(object):
+    __slots__ = ('Length', 'EncapsulationVersion', 'IPAddress', 'VendorID', 'Vendor',
+                 'DeviceID', 'DeviceType', 'ProductCode', 'Revision', 'Status',
+                 'SerialNumber', 'ProductNameLength', 'ProductName', 'State')
 
     def __init__(self):
         # structure of a logix device
@@ -109,7 +112,7 @@ class Device(object):
         resp.Vendor = Device.get_vendor(resp.VendorID)
 
         resp.DeviceID = unpack_from('<H', data, 50)[0]
-        resp.Device = Device.get_device(resp.DeviceID)
+        resp.DeviceType = Device.get_device(resp.DeviceID)
 
         resp.ProductCode = unpack_from('<H', data, 52)[0]
         major = unpack_from('<B', data, 54)[0]
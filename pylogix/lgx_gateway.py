@@ -0,0 +1,303 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import queue
+import socket
+import threading
+
+from .eip import PLC
+from .lgx_comm import Connection
+from concurrent.futures import ThreadPoolExecutor
+from random import randrange
+from struct import unpack_from
+
+
+class Gateway(object):
+    """
+    One TCP connection and session to a communication module, ex: an
+    EN2T, shared by every PLC that is reached through it.  Each PLC
+    still has its own forward open, the replies are handed to the
+    right one by their connection ID (or context when unconnected),
+    so the PLC's can be used from different threads at the same time
+    """
+
+    def __init__(self, ip_address="", timeout=5.0):
+        self.IPAddress = ip_address
+        self.SocketTimeout = timeout
+        self.Port = 44818
+        self.PLCs = []
+
+        # the shared session is an unconnected Connection, which
+        # needs these from its parent
+        self.Route = None
+        self.Micro800 = False
+        self.ProcessorSlot = 0
+        self.PipelineDepth = 1
+        self._session = Connection(self)
+
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._routes = {}
+        self._generation = 0
+        self._next_id = randrange(0x10000, 0x7fffffff)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.Close()
+
+    def PLC(self, slot=0, route=None, Micro800=False):
+        """
+        A PLC reached through the gateway, either in a slot of the
+        gateway's chassis or at the end of a route, the same as
+        PLC.ProcessorSlot and PLC.Route
+
+        returns PLC
+        """
+        plc = PLC(self.IPAddress, slot, self.SocketTimeout, Micro800)
+        plc.Route = route
+        plc.conn.close()
+        plc.conn = GatewayConnection(plc, self)
+        self.PLCs.append(plc)
+        return plc
+
+    def Read(self, reads):
+        """
+        Read from several of the gateway's PLC's at the same time.
+        Takes a dict of each PLC and what to pass to its Read(), a tag
+        or a list of tags
+
+        returns a dict of each PLC and what its Read() returned
+        """
+        return self._each(reads, lambda plc, tags: plc.Read(tags))
+
+    def Write(self, writes):
+        """
+        Write to several of the gateway's PLC's at the same time.
+        Takes a dict of each PLC and a list of (tag, value) to write
+
+        returns a dict of each PLC and what its Write() returned
+        """
+        return self._each(writes, lambda plc, tags: plc.Write(tags))
+
+    def Close(self):
+        """
+        Close the connection of each PLC, then the session
+        """
+        for plc in self.PLCs:
+            plc.Close()
+        with self._lock:
+            session = self._session
+            if session.SocketConnected:
+                try:
+                    self._send(session._buildUnregisterSession())
+                    # wakes up the reader
+                    session.Socket.shutdown(socket.SHUT_RDWR)
+                except (IOError, socket.error):
+                    pass
+            session.SocketConnected = False
+            session._registered = False
+            session.Socket.close()
+
+    def _each(self, work, call):
+        """
+        Call for each PLC in its own thread, the PLC's requests
+        are interleaved on the shared socket
+        """
+        if not work:
+            return {}
+        with ThreadPoolExecutor(len(work)) as executor:
+            futures = dict((plc, executor.submit(call, plc, tags)) for plc, tags in work.items())
+        return dict((plc, future.result()) for plc, future in futures.items())
+
+    def _open(self):
+        """
+        Connect and register the session, if it isn't already, and
+        start handing out the replies
+        """
+        with self._lock:
+            if self._session.SocketConnected:
+                return (True, 'Success')
+            self._session.Port = self.Port
+            ret = self._session._connect(False, 3)
+            if ret[0]:
+                self._generation += 1
+                # the reader waits for replies as long as it takes,
+                # each connection times out on its own
+                self._session.Socket.settimeout(None)
+                # reads this socket, even after the session is opened again
+                reader = Connection(self)
+                reader.Socket.close()
+                reader.Socket = self._session.Socket
+                thread = threading.Thread(target=self._receive, args=(reader,))
+                thread.daemon = True
+                thread.start()
+            return ret
+
+    def _send(self, data):
+        """
+        Send a frame on the shared socket
+        """
+        with self._send_lock:
+            self._session.Socket.sendall(data)
+
+    def _receive(self, reader):
+        """
+        Pass each reply that the reader receives to the connection it
+        belongs to, until the socket closes.  Connected replies carry
+        the connection ID of the forward open, unconnected ones the
+        sender context
+        """
+        try:
+            while True:
+                data = reader.recv_data()
+                if unpack_from('<H', data, 0)[0] == 0x70 and len(data) >= 40:
+                    key = ('id', unpack_from('<I', data, 36)[0])
+                else:
+                    key = ('context', unpack_from('<Q', data, 12)[0])
+                with self._lock:
+                    replies = self._routes.get(key)
+                if replies is not None:
+                    replies.put(data)
+        except (IOError, socket.error):
+            pass
+
+        with self._lock:
+            if self._session.Socket is reader.Socket:
+                self._session.SocketConnected = False
+                # wake up anyone still waiting
+                for replies in set(self._routes.values()):
+                    replies.put(None)
+
+    def _new_id(self, replies, kind):
+        """
+        A connection ID or context that no other connection on the
+        session has, replies to it go to the queue
+        """
+        with self._lock:
+            self._next_id = (self._next_id + 1) & 0xffffffff
+            self._routes[(kind, self._next_id)] = replies
+            return self._next_id
+
+    def _forget(self, kind, value):
+        with self._lock:
+            self._routes.pop((kind, value), None)
+
+
+class GatewayConnection(Connection):
+    """
+    Connection to a PLC through a Gateway.  Frames are sent on the
+    gateway's socket and replies come from the gateway, everything
+    else is the same as Connection
+    """
+
+    def __init__(self, parent, gateway):
+        super(GatewayConnection, self).__init__(parent)
+        self.gateway = gateway
+        self.Socket.close()
+        self.Socket = _SharedSocket(gateway)
+        self._replies = queue.Queue()
+        self._generation = None
+        self._connection_id = None
+        self.Context = gateway._new_id(self._replies, 'context')
+
+    def _connect(self, connected, conn_class):
+        """
+        Use the gateway's session, opening it if needed, then
+        forward open to the PLC
+        """
+        if self._generation != self.gateway._generation:
+            # the session was opened again, the forward open is gone
+            self.SocketConnected = False
+            self._connected = False
+        if self.SocketConnected:
+            if connected == self._connected:
+                return (True, 'Success')
+            # connection type changed, need to close so we can reconnect
+            self._closeConnection()
+
+        ret = self.gateway._open()
+        if not ret[0]:
+            self.SocketConnected = False
+            return ret
+        self._generation = self.gateway._generation
+        self.SessionHandle = self.gateway._session.SessionHandle
+
+        # replies that came after their request timed out
+        while not self._replies.empty():
+            self._replies.get()
+
+        if connected:
+            return self._open_connection()
+
+        self.SocketConnected = True
+        return (self.SocketConnected, 'Success')
+
+    def _closeConnection(self):
+        """
+        Forward close, the session stays open for the other PLC's
+        """
+        super(GatewayConnection, self)._closeConnection()
+        self._connected = False
+        if self._connection_id is not None:
+            self.gateway._forget('id', self._connection_id)
+            self._connection_id = None
+
+    def _new_connection_id(self):
+        """
+        Connection ID's have to be unique on the shared session,
+        they are what replies are told apart by
+        """
+        if self._connection_id is not None:
+            self.gateway._forget('id', self._connection_id)
+        self._connection_id = self.gateway._new_id(self._replies, 'id')
+        return self._connection_id
+
+    def _new_stripe(self):
+        """
+        Extra connections are more forward opens on the same session
+        """
+        return GatewayConnection(self.parent, self.gateway)
+
+    def recv_data(self):
+        """
+        The next reply that the gateway received for this connection
+        """
+        try:
+            data = self._replies.get(timeout=self.parent.SocketTimeout)
+        except queue.Empty:
+            raise socket.timeout('timed out')
+        if data is None:
+            raise socket.error('Connection to the gateway was lost')
+        return data
+
+
+class _SharedSocket(object):
+    """
+    Stands in for the socket of a GatewayConnection, frames go out
+    on the gateway's socket, which stays open when the PLC closes
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def send(self, data):
+        self.gateway._send(data)
+        return len(data)
+
+    def close(self):
+        pass
+
@@ -0,0 +1,52 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+
+class TagGroup(object):
+    """
+    A list of tags that is read over and over.  The multi-service
+    requests and the way to decode each reply are worked out once,
+    each read after that only sends the requests and unpacks the
+    replies.  Created with PLC.CompileRead(), read with PLC.Read()
+    """
+
+    def __init__(self, tags):
+        self.Tags = list(tags)
+
+        # one request per packet, and for each packet, where its
+        # tags are in the list and how to decode them.  Tags too big
+        # to share a packet are read on their own
+        self._requests = []
+        self._indexes = []
+        self._decoders = []
+        self._large = []
+        # for each read, the index of its tag, or the members of a
+        # struct that are taken out of it
+        self._owners = []
+        self._connection_size = None
+
+    def __repr__(self):
+        return 'TagGroup(Tags={})'.format(self.Tags)
+
+    def __len__(self):
+        return len(self.Tags)
+
+    @property
+    def Compiled(self):
+        """
+        True once the requests have been built
+        """
+        return self._connection_size is not None
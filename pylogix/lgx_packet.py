@@ -0,0 +1,117 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from struct import Struct
+
+# The struct formats are compiled once and each packet is put together
+# with a single join, rather than concatenated piece by piece.  Packing
+# into a preallocated bytearray was measured too, it is slower for
+# packets this small
+
+# SendUnitData (connected): encapsulation header (command, length,
+# session handle, status, context, options), interface handle, timeout,
+# item count, connected address item (id, length, connection id) and
+# connected data item (id, length, sequence count)
+CONNECTED_HEADER = Struct('<HHIIQIIHHHHIHHH')
+
+# SendRRData (unconnected): encapsulation header, interface handle,
+# timeout, item count, null address item (id, length) and unconnected
+# data item (id, length)
+UNCONNECTED_HEADER = Struct('<HHIIQIIHHHHHH')
+
+# Unconnected Send to the connection manager (class 0x06, instance 1),
+# priority, timeout ticks and the size of the embedded request
+UNCONNECTED_SEND = Struct('<BBBBBBBBH')
+
+# service code and request path size in words
+SERVICE = Struct('<BB')
+# element count
+READ = Struct('<H')
+# element count and byte offset
+PARTIAL_READ = Struct('<HI')
+
+# Multiple Service Packet to the message router (class 0x02, instance 1)
+MULTI_SERVICE_HEADER = bytes((0x0A, 0x02, 0x20, 0x02, 0x24, 0x01))
+
+# offset tables are cached by the number of services
+_offset_tables = {}
+
+
+def connected_frame(session, context, connection_id, sequence, request):
+    """
+    Wrap a request in the SendUnitData header
+    """
+    size = len(request)
+    return CONNECTED_HEADER.pack(0x70, 22 + size, session, 0x00, context, 0x00,
+                                 0x00, 0x00, 0x02,
+                                 0xA1, 0x04, connection_id,
+                                 0xB1, size + 2, sequence) + request
+
+
+def unconnected_frame(session, context, request, path=None):
+    """
+    Wrap a request in the SendRRData header.  When a path is
+    provided, the request is sent through the connection manager
+    with Unconnected Send
+    """
+    if path is None:
+        size = len(request)
+        return UNCONNECTED_HEADER.pack(0x6F, 16 + size, session, 0x00, context, 0x00,
+                                       0x00, 0x00, 0x02,
+                                       0x00, 0x00,
+                                       0xB2, size) + request
+
+    size = UNCONNECTED_SEND.size + len(request) + len(path)
+    return b''.join((UNCONNECTED_HEADER.pack(0x6F, 16 + size, session, 0x00, context, 0x00,
+                                             0x00, 0x00, 0x02,
+                                             0x00, 0x00,
+                                             0xB2, size),
+                     UNCONNECTED_SEND.pack(0x52, 0x02, 0x20, 0x06, 0x24, 0x01, 0x0A, 0x0e,
+                                           len(request)),
+                     request,
+                     path))
+
+
+def read_request(ioi, elements):
+    """
+    Read Tag service (0x4C)
+    """
+    return b''.join((SERVICE.pack(0x4C, len(ioi) // 2), ioi, READ.pack(elements)))
+
+
+def partial_read_request(ioi, elements, offset):
+    """
+    Read Tag Fragmented service (0x52), starting at the byte offset
+    """
+    return b''.join((SERVICE.pack(0x52, len(ioi) // 2), ioi, PARTIAL_READ.pack(elements, offset)))
+
+
+def multi_service_request(services):
+    """
+    Bundle several service requests into one Multiple Service Packet.
+    Each offset in the table is relative to the service count
+    """
+    count = len(services)
+    table = _offset_tables.get(count)
+    if table is None:
+        table = _offset_tables[count] = Struct('<{}H'.format(count + 1))
+
+    offsets = []
+    offset = table.size
+    for service in services:
+        offsets.append(offset)
+        offset += len(service)
+
+    return b''.join([MULTI_SERVICE_HEADER, table.pack(count, *offsets)] + services)
@@ -17,6 +17,7 @@
 import sys
 
 class Response(object):
+    __slots__ = ('TagName', 'Value', 'Status')
 
     def __init__(self, tag_name, value, status):
         self.TagName = tag_name
@@ -53,6 +54,50 @@ class Response(object):
             err = 'Unknown error {}'.format(status)
         return err
 
+class ResponseColumns(object):
+    """
+    The results of reading a list of tags, kept as columns of tag
+    names, values and statuses instead of a Response for each tag.
+    Returned by PLC.Read() when PLC.ColumnResults is True.  Indexing
+    or iterating makes Response's, one at a time
+    """
+    __slots__ = ('TagNames', 'Values', 'Statuses')
+
+    def __init__(self, tag_names, values, statuses):
+        self.TagNames = tag_names
+        self.Values = values
+        self.Statuses = statuses
+
+    def __repr__(self):
+
+        return 'ResponseColumns(TagNames={}, Values={}, Statuses={})'.format(
+            self.TagNames, self.Values, self.Statuses)
+
+    def __len__(self):
+        return len(self.TagNames)
+
+    def __getitem__(self, index):
+        return Response(self.TagNames[index], self.Values[index], self.Statuses[index])
+
+    def __iter__(self):
+        for i in range(len(self.TagNames)):
+            yield self[i]
+
+    def to_dict(self):
+        """
+        The values by tag name
+        """
+        return dict(zip(self.TagNames, self.Values))
+
+    def to_dataframe(self):
+        """
+        A pandas DataFrame with TagName, Value and Status columns
+        """
+        import pandas
+        return pandas.DataFrame({'TagName': self.TagNames,
+                                 'Value': self.Values,
+                                 'Status': self.Statuses})
+
 cip_error_codes = {0x00: 'Success',
                    0x01: 'Connection failure',
                    0x02: 'Resource unavailable',
@@ -17,6 +17,10 @@
 from struct import unpack_from
 
 class Tag(object):
+    # a tag list can have tens of thousands of tags, keep them small
+    __slots__ = ('TagName', 'InstanceID', 'SymbolType', 'DataTypeValue', 'DataType',
+                 'Array', 'Struct', 'Size', 'AccessRight', 'Internal', 'Meta',
+                 'Scope0', 'Scope1', 'Bytes', 'UDT')
 
     def __init__(self):
 
@@ -34,6 +38,7 @@ class Tag(object):
         self.Scope0 = None
         self.Scope1 = None
         self.Bytes = None
+        self.UDT = None
 
     def __repr__(self):
 
@@ -111,11 +116,14 @@ class Tag(object):
         return t
 
 class UDT(object):
+    __slots__ = ('Type', 'Name', 'Handle', 'Size', 'Fields', 'FieldsByName')
 
     def __init__(self):
 
         self.Type = 0
         self.Name = ''
+        self.Handle = 0
+        self.Size = 0
         self.Fields = []
         self.FieldsByName = {}
 
@@ -124,6 +132,8 @@ class UDT(object):
         props = ''
         props += 'Type={} '.format(self.Type)
         props += 'Name={} '.format(self.Name)
+        props += 'Handle={} '.format(self.Handle)
+        props += 'Size={} '.format(self.Size)
         props += 'Fields={} '.format(self.Fields)
         props += 'FieldsByName={}'.format(self.FieldsByName)
 
@@ -131,8 +141,10 @@ class UDT(object):
 
     def __str__(self):
 
-        return '{} {} {} {}'.format(
+        return '{} {} {} {} {} {}'.format(
                 self.Type,
                 self.Name,
+                self.Handle,
+                self.Size,
                 self.Fields,
                 self.FieldsByName)
\ No newline at end of file
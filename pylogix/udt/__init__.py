@@ -1 +1,2 @@
-from .lgx_udt import SINT, INT, DINT, REAL, LINT, STRING, SPARE, ARRAY, TIMER, COUNTER, BOOLS, UDT
\ No newline at end of file
+from .lgx_udt import SINT, INT, DINT, REAL, LINT, STRING, SPARE, ARRAY, TIMER, COUNTER, BOOLS, UDT
+from .lgx_udt import USINT, UINT, UDINT, ULINT, LREAL, BOOL_ARRAY, from_template
@@ -1,5 +1,12 @@
 import struct
 from collections import OrderedDict
+from operator import itemgetter
+
+# numpy is optional, it is only needed for dtype()
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class CIPType(object):
@@ -50,24 +57,64 @@ class CIPType(object):
         and an opitonal offset and then return a regular (non-Ordered) dictionary
         with the data assigned to the keys.
         """
-        pack_struct = self.struct
-        if endian is not None:
-          pack_struct = struct.Struct(endian + self.format)
+        pack_struct = self.compile()[0]
+        if endian is not None and endian != '<':
+            pack_struct = struct.Struct(endian + self.format.lstrip('@=<>!'))
         data_list = self.create_packlist(value)
         return pack_struct.pack(*data_list)
 
+    def compile_unpack(self, index=0):
+        """
+        Work out once how to take this value out of the unpacked elements, so that
+        nothing has to be sliced or walked when unpacking.
+        :param index: where the elements of this value start in the unpacked list
+        :return: (function that takes the unpacked list and returns the value, index after the elements used)
+        """
+        count = len(struct.unpack('<' + self.format, bytes(struct.calcsize('<' + self.format))))
+        return lambda values: self.parse_unpacked(values[index:index + count])[0], index + count
+
+    def compile(self):
+        """
+        The struct for the whole structure, flattened, and the function that rebuilds
+        the value from what it unpacks.  Worked out the first time it is needed
+        :return: (struct.Struct, function)
+        """
+        if getattr(self, '_compiled', None) is None:
+            getter, count = self.compile_unpack(0)
+            self._compiled = (struct.Struct('<' + self.format.lstrip('@=<>!')), getter)
+        return self._compiled
+
     def unpack(self, data_array, offset=0, endian=None):
         """
         Take raw response data which should be an iterable byte structure,
         and then return an ordered dictionary with the data assigned to the keys.
         """
-        unpack_struct = self.struct
-        endian = '<'
-        if endian is not None:
-          unpack_struct = struct.Struct(endian + self.format)
-        unpacked = unpack_struct.unpack_from(data_array, offset)
+        unpack_struct, getter = self.compile()
+        if endian is not None and endian != '<':
+            unpack_struct = struct.Struct(endian + self.format.lstrip('@=<>!'))
+        return getter(unpack_struct.unpack_from(data_array, offset))
 
-        return self.parse_unpacked(unpacked)[0]
+    def dtype(self):
+        """
+        The numpy dtype with the same layout as this structure, so an array of them can be
+        used without unpacking, ex: numpy.frombuffer(data, UDT.dtype())
+        """
+        _need_numpy()
+        return numpy.dtype('V{}'.format(struct.calcsize('<' + self.format.lstrip('@=<>!'))))
+
+    def unpack_many(self, data_array, count, offset=0, size=None):
+        """
+        Unpack count values that follow each other, ex: an array of UDT's.
+        :param count: how many values to unpack
+        :param offset: where the first value starts
+        :param size: bytes from the start of one value to the next, the size of the structure by default
+        :return: a list of the values
+        """
+        unpack_struct, getter = self.compile()
+        if size is None or size == unpack_struct.size:
+            view = memoryview(data_array)[offset:offset + count * unpack_struct.size]
+            return [getter(values) for values in unpack_struct.iter_unpack(view)]
+        return [getter(unpack_struct.unpack_from(data_array, offset + i * size)) for i in range(count)]
 
 
 
@@ -86,6 +133,13 @@ class BasicType(CIPType):
 
         return unpacked_data[0], 1
 
+    def compile_unpack(self, index=0):
+        return itemgetter(index), index + 1
+
+    def dtype(self):
+        _need_numpy()
+        return numpy.dtype('<' + self.format)
+
     def create_packlist(self, value):
         """
         :return: Returns a list that gets combined onto the end of the current list to be packed.
@@ -138,6 +192,13 @@ class BYTES(CIPType):
 
         return str_data, 1
 
+    def compile_unpack(self, index=0):
+        return itemgetter(index), index + 1
+
+    def dtype(self):
+        _need_numpy()
+        return numpy.dtype('S{}'.format(self.length))
+
     def create_packlist(self, value):
         """
         :return: Returns a list that gets combined onto the end of the current list to be packed.
@@ -153,22 +214,27 @@ class BYTES(CIPType):
 
 
 class STRING(CIPType):
-    def __init__(self, length=82, null_term=False, encoding=None):
+    def __init__(self, length=82, null_term=False, encoding=None, size=None):
         """
         Structure object for creating strings.  These map to python strings
         :param length: how many elements the array contains
         :param null_term: whether the returned string should end at the first null byte
         :param encoding: what encoding to use when converting to a string and back
+        :param size: bytes the PLC uses for the whole string, LEN and DATA are padded
+         to it (ex: 88 for the built in STRING).  Arrays of strings are this far apart
         """
         self.length = length
         self.encoding = encoding
         self.null_term = null_term
+        self.size = max(size or 0, 4 + length)
         self.format = 'I{}s'.format(length)
+        if self.size > 4 + length:
+            self.format += '{}x'.format(self.size - 4 - length)
         self.struct = struct.Struct(self.format)
         self.alignment = 4
 
     def __reduce__(self):
-        return (self.__class__, (self.length, self.null_term, self.encoding))
+        return (self.__class__, (self.length, self.null_term, self.encoding, self.size))
 
 
     def parse_unpacked(self, unpacked_data):
@@ -178,17 +244,36 @@ class STRING(CIPType):
         """
 
         strlen = unpacked_data[0]
+        raw = unpacked_data[1]
+        # only the characters in use, what is past them can be anything
+        if self.null_term:
+            raw = raw.split(b'\x00', 1)[0]
+        else:
+            raw = raw[:strlen]
+
         if self.encoding is None:
-            str_data = unpacked_data[1].decode()
+            str_data = raw.decode()
         else:
-            str_data = unpacked_data[1].decode(encoding=self.encoding)
+            str_data = raw.decode(encoding=self.encoding)
 
+        return str_data, 2
+
+    def compile_unpack(self, index=0):
+        encoding = self.encoding or 'utf-8'
         if self.null_term:
-            str_data = str_data[:str_data.find('\x00')]
+            def getter(values):
+                return values[index + 1].split(b'\x00', 1)[0].decode(encoding)
         else:
-            str_data = str_data[:strlen]
+            def getter(values):
+                return values[index + 1][:values[index]].decode(encoding)
+        return getter, index + 2
 
-        return str_data, 2
+    def dtype(self):
+        _need_numpy()
+        return numpy.dtype({'names': ['LEN', 'DATA'],
+                            'formats': ['<u4', 'S{}'.format(self.length)],
+                            'offsets': [0, 4],
+                            'itemsize': self.size})
 
     def create_packlist(self, value):
         """
@@ -196,9 +281,12 @@ class STRING(CIPType):
          It should match the format returned by get_format
         """
         if self.encoding is not None:
-            return [len(value), value.encode(encoding=self.encoding)]
+            encoded = value.encode(encoding=self.encoding)
         else:
-            return [len(value), value.encode()]
+            encoded = value.encode()
+        # the PLC would read past the end of DATA if LEN were longer
+        encoded = encoded[:self.length]
+        return [len(encoded), encoded]
 
 
 class SPARE(CIPType):
@@ -228,6 +316,9 @@ class SPARE(CIPType):
         """
         return None, 0
 
+    def compile_unpack(self, index=0):
+        return lambda values: None, index
+
     def create_packlist(self, value):
         """
         in this case we return nothing because this is padding and no values need to end up converted
@@ -273,6 +364,23 @@ class ARRAY(CIPType):
             value_list.append(new_value)
         return value_list, item_count
 
+    def compile_unpack(self, index=0):
+        start = index
+        if isinstance(self.data_type, (BasicType, BYTES)):
+            # one element each, the list is a slice
+            end = start + self.length
+            return lambda values: list(values[start:end]), end
+
+        getters = []
+        for i in range(self.length):
+            getter, index = self.data_type.compile_unpack(index)
+            getters.append(getter)
+        return lambda values: [getter(values) for getter in getters], index
+
+    def dtype(self):
+        _need_numpy()
+        return numpy.dtype((self.data_type.dtype(), (self.length,)))
+
     def create_packlist(self, value):
         """
         :return:
@@ -304,6 +412,7 @@ class BOOLS(CIPType):
 
     def add(self, bitname):
         self.BitNames.append(bitname)
+        self._compiled = None
 
     def __reduce__(self):
         return (self.__class__, (self.length,))
@@ -315,7 +424,6 @@ class BOOLS(CIPType):
         """
 
         str_data = {}
-        print(unpacked_data)
 
         bitpos = 0
         for bitname in self.BitNames:
@@ -330,22 +438,39 @@ class BOOLS(CIPType):
 
         return str_data, self.length
 
+    def compile_unpack(self, index=0):
+        bits = self.bit_getters(index)
+        return lambda values: {name: getter(values) for name, getter in bits}, index + self.length
+
+    def dtype(self):
+        """
+        numpy can't address single bits, the bits are kept in an unsigned int where
+        bit n is the nth name (or bytes, when there are more than 64)
+        """
+        _need_numpy()
+        if self.length in (1, 2, 4, 8):
+            return numpy.dtype('<u{}'.format(self.length))
+        return numpy.dtype(('u1', (self.length,)))
+
+    def bit_getters(self, index=0):
+        """
+        :return: a list of (name, function that takes the unpacked list and returns the bit)
+        """
+        bits = []
+        for bitpos, bitname in enumerate(self.BitNames):
+            if bitname != "":
+                bits.append((bitname, _bit_getter(index + bitpos // self.bitlen, 1 << bitpos % self.bitlen)))
+        return bits
+
     def create_packlist(self, value):
         """
         :return: Returns a list that gets combined onto the end of the current list to be packed.
          It should match the format returned by get_format
         """
-        bitpos = 0
         words = [0] * self.length
-        for bitname in self.BitNames:
-            wordpos = bitpos // 32
-            wordbit = bitpos % 32
-            word = words[wordpos]
-            bitval = value.get(bitname)
-            if bitval:
-                mask =  1 << wordbit
-                words[wordpos] |= mask
-            bitpos+= 1
+        for bitpos, bitname in enumerate(self.BitNames):
+            if bitname != "" and value.get(bitname):
+                words[bitpos // self.bitlen] |= 1 << (bitpos % self.bitlen)
         return words
 
     def null(self):
@@ -355,6 +480,52 @@ class BOOLS(CIPType):
         return bytes([0] * len(self))
 
 
+class BOOL_ARRAY(CIPType):
+    def __init__(self, length):
+        """
+        Structure object for BOOL array members, the bools are packed into 32 bit words.
+        These map to python lists of True/False
+        :param length: how many bools the array contains, a multiple of 32
+        """
+        self.length = length
+        self.words = ((length - 1) // 32) + 1
+        self.format = '{}I'.format(self.words)
+        self.struct = struct.Struct(self.format)
+        self.alignment = 4
+
+    def __reduce__(self):
+        return (self.__class__, (self.length,))
+
+    def parse_unpacked(self, unpacked_data):
+        """
+        :param unpacked_data: a python list of the unpacked elements
+        :return: (value, number of items used from list)
+        """
+        value_list = []
+        for word in unpacked_data[:self.words]:
+            value_list += [word & (1 << bit) != 0 for bit in range(32)]
+        return value_list[:self.length], self.words
+
+    def compile_unpack(self, index=0):
+        bits = [(index + i // 32, 1 << i % 32) for i in range(self.length)]
+        return lambda values: [values[word] & mask != 0 for word, mask in bits], index + self.words
+
+    def dtype(self):
+        _need_numpy()
+        return numpy.dtype(('<u4', (self.words,)))
+
+    def create_packlist(self, value):
+        """
+        :return: Returns a list that gets combined onto the end of the current list to be packed.
+         It should match the format returned by get_format
+        """
+        words = [0] * self.words
+        for i, bitval in enumerate(value[:self.length]):
+            if bitval:
+                words[i // 32] |= 1 << (i % 32)
+        return words
+
+
 class UDT(CIPType):
     """
     This is the core binary struct class that will need used.
@@ -371,8 +542,13 @@ class UDT(CIPType):
         self.format = '' + self.endianness
 
         self.structure_def = []
+        # members placed at a known offset, by their position in structure_def
+        self.offsets = {}
+        # where each member ended up, worked out with the format
+        self.member_offsets = []
         self.struct = struct.Struct(self.format)
         self.alignment = 4
+        self._compiled = None
 
     def __setitem__(self, item, value):
         #if isinstance(value, BOOL):
@@ -381,6 +557,18 @@ class UDT(CIPType):
         #        # already packing some bools.
         #        self.structure_def[-1][1].Add(item)
 
+        self.add(item, value)
+
+    def add(self, item, value, offset=None):
+        """
+        Add a member to the end of the structure
+        :param item: the member's name.  None adds an unnamed member, the keys of its
+         value (BOOLS) end up alongside the other members
+        :param value: a CIPType instance
+        :param offset: byte offset of the member, by default it is aligned after the last one
+        """
+        if offset is not None:
+            self.offsets[len(self.structure_def)] = offset
         self.structure_def.append((item, value))
         self.rebuild_format()
 
@@ -391,19 +579,49 @@ class UDT(CIPType):
     
     def rebuild_format(self):
         self.format = self.endianness
-        for k, v in self.structure_def:
-            s = struct.Struct(self.format)
-            offset = s.size % v.alignment
-            if offset > 0 :
-                self.format += "{}x".format(v.alignment - offset)
+        self.member_offsets = []
+        for i, (k, v) in enumerate(self.structure_def):
+            # the PLC doesn't pad beyond what is asked for, so neither can we
+            size = struct.calcsize('<' + self.format.lstrip('@=<>!'))
+            if i in self.offsets:
+                if self.offsets[i] > size:
+                    self.format += "{}x".format(self.offsets[i] - size)
+            else:
+                offset = size % v.alignment
+                if offset > 0 :
+                    self.format += "{}x".format(v.alignment - offset)
+            self.member_offsets.append(struct.calcsize('<' + self.format.lstrip('@=<>!')))
             self.format += v.format
 
-        print(self.format)
         self.struct = struct.Struct(self.format)
+        self._compiled = None
 
     def __reduce__(self):
         return (self.__class__, (self.structure_def,))
 
+    def dtype(self):
+        """
+        Members are at the offsets worked out for the format.  numpy can't address single
+        bits, the bytes of unnamed BOOLS are named after their offset, ex: _bools0
+        """
+        _need_numpy()
+        names = []
+        formats = []
+        offsets = []
+        for (k, v), offset in zip(self.structure_def, self.member_offsets):
+            if k is None:
+                if not isinstance(v, BOOLS):
+                    continue
+                k = '_bools{}'.format(offset)
+            names.append(k)
+            formats.append(v.dtype())
+            offsets.append(offset)
+        return numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                            'itemsize': len(self)})
+
+    def __len__(self):
+        return struct.calcsize('<' + self.format.lstrip('@=<>!'))
+
     def create_packlist(self, value):
         """
          returns a list that gets combined onto the end of the current list to be packed.
@@ -411,31 +629,60 @@ class UDT(CIPType):
         :return:
         """
         data_list = []
-        keys = list(self.structure_def.keys())
 
-        for k in keys:
-            struct_type = self.structure_def[k]
-            val = value.get(k)  # will return None if the key is missing
+        for k, struct_type in self.structure_def:
+            if k is None or isinstance(struct_type, SPARE):
+                # unnamed members (BOOLS) take their values from this dict
+                val = value
+            else:
+                val = value[k]
             data_list += struct_type.create_packlist(val)
 
         return data_list
 
     def parse_unpacked(self, unpacked_data):
-        # final_dict = OrderedDict()
-        final_dict = {}
+        getter, count = self.compile_unpack(0)
+        return getter(unpacked_data), count
+
+    def compile_unpack(self, index=0):
+        # every member's value is at a known place in the unpacked list,
+        # the BOOLs of unnamed BOOLS are added as members of their own
+        members = []
+        merge = False
+        for k, v in self.structure_def:
+            start = index
+            getter, index = v.compile_unpack(index)
+            if k is not None:
+                members.append((k, getter))
+            elif isinstance(v, BOOLS):
+                members += v.bit_getters(start)
+            elif not isinstance(v, SPARE):
+                members.append((None, getter))
+                merge = True
 
+        if not merge:
+            return lambda values: {k: getter(values) for k, getter in members}, index
+
+        def getter(values):
+            final_dict = {}
+            for k, member_getter in members:
+                if k is None:
+                    final_dict.update(member_getter(values))
+                else:
+                    final_dict[k] = member_getter(values)
+            return final_dict
+        return getter, index
 
-        unpack_offset = 0
-        x = 0
-        for k, v in self.structure_def:
-            final_dict[k], new_offset = v.parse_unpacked(unpacked_data[x + unpack_offset:])
-            print(f'{k}: {final_dict[k]}')
-            unpack_offset += new_offset - 1
-            x += 1
 
-        return final_dict, x + unpack_offset
 
 
+def _need_numpy():
+    if numpy is None:
+        raise ImportError('numpy is needed for dtype(), pip install pylogix[numpy]')
+
+
+def _bit_getter(index, mask):
+    return lambda values: values[index] & mask != 0
 
 
 # note that for some reason the bits on these built-in data types are backwards (big endian on a 16 bit word boundary)
@@ -448,3 +695,89 @@ COUNTER = UDT()
 COUNTER['StatusBits'] = BOOLS([""] * 27 + ["UN", "OV", "DN", "CD", "CU"])
 COUNTER['PRE'] = DINT
 COUNTER['ACC'] = DINT
+
+
+# template members of these types map straight onto a BasicType
+CIP_TYPES = {0xc2: SINT, 0xc3: INT, 0xc4: DINT, 0xc5: LINT, 0xc6: USINT, 0xc7: UINT,
+             0xc8: UDINT, 0xc9: ULINT, 0xca: REAL, 0xcb: LREAL}
+
+
+def from_template(template, templates, encoding=None, codecs=None):
+    """
+    Create the structure object of a UDT uploaded from the PLC (PLC.GetTagList()), so it
+    doesn't have to be written by hand.  Every member is placed at the offset the PLC uses.
+    BOOL members end up alongside the other members instead of under the hidden member that
+    holds their bits, and string types become a STRING
+    :param template: the UDT from PLC.UDT or PLC.UDTByName
+    :param templates: PLC.UDT, used to look up nested UDT's
+    :param encoding: what encoding to use for strings
+    :param codecs: optional dict of the structure objects already created, by UDT type.  Pass
+     the same dict to share nested structure objects between calls
+    :return: a UDT (or STRING) instance
+    """
+    if codecs is None:
+        codecs = {}
+    return _from_template(template, templates, encoding, codecs)
+
+
+def _from_template(template, templates, encoding, codecs):
+    if template.Type in codecs:
+        return codecs[template.Type]
+
+    members = dict((f.TagName, f) for f in template.Fields)
+    if len(members) == 2 and 'LEN' in members and members.get('DATA') and members['DATA'].Array:
+        codecs[template.Type] = STRING(members['DATA'].Size, encoding=encoding, size=template.Size)
+        return codecs[template.Type]
+
+    # the bit of a BOOL member is where the size of an array would be,
+    # the BOOLs share the offset of the (hidden) member they are stored in
+    fields = sorted(template.Fields, key=lambda f: f.Meta)
+    bits = {}
+    for f in fields:
+        if f.SymbolType == 0xc1 and not f.Array:
+            bits.setdefault(f.Meta, {})[struct.unpack_from('<H', f.Bytes, 0)[0]] = f.TagName
+
+    codec = UDT()
+    for f in fields:
+        if f.Meta in bits:
+            if f.SymbolType == 0xc1 and not f.Array:
+                # no member holds these bits, only take the bytes they need
+                length = (max(bits[f.Meta]) // 8 + 1) * 8
+            else:
+                length = len(CIP_TYPES.get(f.SymbolType, SINT)) * 8
+            names = [bits[f.Meta].get(bit, '') for bit in range(length)]
+            codec.add(None, BOOLS(names), f.Meta)
+            del bits[f.Meta]
+        elif f.SymbolType != 0xc1 or f.Array:
+            codec.add(f.TagName, _member_type(f, templates, encoding, codecs), f.Meta)
+
+    size = struct.calcsize('<' + codec.format)
+    if size > template.Size:
+        # the values would be read from the wrong offsets
+        raise ValueError('UDT {} is {} bytes, its members need {}'.format(template.Name, template.Size, size))
+    if template.Size > size:
+        codec.add(None, SPARE(template.Size - size))
+
+    codecs[template.Type] = codec
+    return codec
+
+
+def _member_type(field, templates, encoding, codecs):
+    """
+    Structure object for a single template member
+    """
+    if field.Struct:
+        if field.DataTypeValue not in templates:
+            raise ValueError('UDT {} of {} is unknown'.format(field.DataTypeValue, field.TagName))
+        data_type = _from_template(templates[field.DataTypeValue], templates, encoding, codecs)
+    elif field.SymbolType == 0xd3:
+        # BOOL arrays are made of DWORD's
+        return BOOL_ARRAY(max(field.Size, 1) * 32)
+    elif field.SymbolType in CIP_TYPES:
+        data_type = CIP_TYPES[field.SymbolType]
+    else:
+        raise ValueError('Unknown data type {} of {}'.format(field.SymbolType, field.TagName))
+
+    if field.Array:
+        return ARRAY(data_type, field.Size)
+    return data_type
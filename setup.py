@@ -15,6 +15,8 @@ setuptools.setup(
     license="Apache License 2.0",
     url="https://github.com/dmroeder/pylogix",
     packages=setuptools.find_packages(),
+    extras_require={"numpy": ["numpy"], "pandas": ["pandas"]},
+    entry_points={"console_scripts": ["pylogix-codegen=pylogix.lgx_codegen:main"]},
     classifiers=[
         "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3.6",
@@ -17,11 +17,17 @@
    limitations under the License.
 """
 
+import array
+import asyncio
 import plcConfig  # Info: tests\README.md - Setup test configuration file
 import pylogix
+import shutil
+import tempfile
 import time
 import unittest
 
+from concurrent.futures import ThreadPoolExecutor
+from pylogix.lgx_codegen import generate
 from pylogix.lgx_response import Response
 from pylogix.lgx_tag import Tag  # Need Classes for type checking
 from Randomizer import Randomizer
@@ -439,6 +445,263 @@ class PylogixTests(unittest.TestCase):
             isinstance(program_tags.Value[0], Tag),
             True, "LgxTag class not found in GetProgramTagList Value")
 
+    def test_async_read(self):
+        async def read(tags):
+            async with pylogix.AsyncPLC(plcConfig.plc_ip, plcConfig.plc_slot,
+                                        Micro800=plcConfig.isMicro800) as comm:
+                return await comm.Read(tags)
+
+        self.comm.Write('BaseDINT', 42)
+        ret = asyncio.run(read('BaseDINT'))
+        self.assertEqual(ret.Value, 42, ret.Status)
+        ret = asyncio.run(read(['BaseDINT', 'BaseINT']))
+        self.assertEqual(ret[0].Value, 42, ret[0].Status)
+        with self.assertRaises(TypeError):
+            with pylogix.AsyncPLC(plcConfig.plc_ip):
+                pass
+
+    def test_compiled_read(self):
+        tags = ['BaseDINT', 'BaseINT', 'BaseSTRING', 'BaseBool', 'BaseBits.31']
+        group = self.comm.CompileRead(tags)
+        self.assertTrue(group.Compiled)
+        for expected, ret in zip(self.comm.Read(tags), self.comm.Read(group)):
+            self.assertEqual(ret.TagName, expected.TagName)
+            self.assertEqual(ret.Value, expected.Value)
+            self.assertEqual(ret.Status, expected.Status)
+
+    @unittest.skipIf(plcConfig.isMicro800, 'for Micro800')
+    def test_multi_read_counts(self):
+        tags = [('BaseDINTArray[0]', 10), ('BaseREALArray[10]', 10), 'BaseDINT', ('BaseBits.0', 8)]
+        for t, ret in zip(tags, self.comm.Read(tags)):
+            if isinstance(t, tuple):
+                expected = self.comm.Read(*t)
+            else:
+                expected = self.comm.Read(t)
+            self.assertEqual(ret.TagName, expected.TagName)
+            self.assertEqual(ret.Value, expected.Value)
+            self.assertEqual(ret.Status, expected.Status)
+
+    def test_array_results(self):
+        expected = self.comm.Read('BaseDINTArray[0]', 10)
+        self.comm.ArrayResults = True
+        try:
+            ret = self.comm.Read('BaseDINTArray[0]', 10)
+        finally:
+            self.comm.ArrayResults = False
+        self.assertEqual(list(ret.Value), expected.Value, ret.Status)
+
+    @unittest.skipIf(plcConfig.isMicro800, 'for Micro800')
+    def test_packed_bits(self):
+        expected = self.comm.Read('BaseBits.0', 32)
+        self.comm.PackedBits = True
+        try:
+            ret = self.comm.Read('BaseBits.0', 32)
+        finally:
+            self.comm.PackedBits = False
+        self.assertEqual([bool(ret.Value >> i & 1) for i in range(32)], expected.Value, ret.Status)
+
+    @unittest.skipIf(plcConfig.isMicro800, 'for Micro800')
+    def test_instance_addressing(self):
+        tags = ['BaseDINT', 'BaseSTRING', 'BaseBits.31', 'BaseDINTArray[3]']
+        expected = self.comm.Read(tags)
+        self.comm.GetTagList()
+        self.comm.InstanceAddressing = True
+        try:
+            ret = self.comm.Read(tags)
+        finally:
+            self.comm.InstanceAddressing = False
+        for e, r in zip(expected, ret):
+            self.assertEqual(r.Value, e.Value, r.Status)
+
+    def test_tag_list_cache(self):
+        cache = tempfile.mkdtemp()
+        try:
+            self.comm.TagListCache = cache
+            uploaded = self.comm.GetTagList()
+            cached = self.comm.GetTagList()
+        finally:
+            self.comm.TagListCache = None
+            shutil.rmtree(cache)
+        self.assertEqual([t.TagName for t in cached.Value], [t.TagName for t in uploaded.Value])
+        self.assertEqual(sorted(self.comm.UDTByName), sorted(self.comm.UDT[k].Name for k in self.comm.UDT))
+
+    def test_udt_results(self):
+        members = ['b_SINT', 'b_INT', 'b_DINT', 'b_REAL', 'b_STRING']
+        expected = self.comm.Read(['UDTBasic.' + m for m in members])
+        self.comm.GetTagList()
+        self.comm.UDTResults = True
+        try:
+            ret = self.comm.Read('UDTBasic')
+        finally:
+            self.comm.UDTResults = False
+        for m, e in zip(members, expected):
+            self.assertEqual(ret.Value[m], e.Value, m)
+        self.assertEqual(ret.Value['b_BOOL'], self.comm.Read('UDTBasic.b_BOOL').Value)
+
+    def test_udt_results_without_tag_list(self):
+        with pylogix.PLC(plcConfig.plc_ip, plcConfig.plc_slot) as comm:
+            comm.UDTResults = True
+            ret = comm.Read('UDTBasic')
+        self.assertEqual(ret.Status, 'Success')
+        self.assertEqual(bytes(ret.Value), bytes(self.comm.Read('UDTBasic').Value))
+
+    def test_udt_string_array_results(self):
+        expected = self.comm.Read(['UDTArray.b_STRING[{}]'.format(i) for i in range(32)])
+        self.comm.GetTagList()
+        self.comm.UDTResults = True
+        try:
+            ret = self.comm.Read('UDTArray')
+        finally:
+            self.comm.UDTResults = False
+        self.assertEqual(ret.Value['b_STRING'], [e.Value for e in expected])
+
+    @unittest.skipIf(pylogix.lgx_array.numpy is None, 'needs numpy')
+    def test_udt_array_results(self):
+        self.comm.GetTagList()
+        self.comm.UDTResults = True
+        try:
+            expected = self.comm.Read('UDTArray2[0]', 2)
+            self.comm.ArrayResults = True
+            ret = self.comm.Read('UDTArray2[0]', 2)
+        finally:
+            self.comm.UDTResults = False
+            self.comm.ArrayResults = False
+        self.assertEqual([list(v) for v in ret.Value['b_DINT']], [v['b_DINT'] for v in expected.Value])
+
+    @unittest.skipIf(pylogix.lgx_array.numpy is None, 'needs numpy')
+    def test_udt_dtype_size(self):
+        self.comm.GetTagList()
+        codecs = {}
+        for template in self.comm.UDT.values():
+            codec = pylogix.udt.from_template(template, self.comm.UDT, codecs=codecs)
+            self.assertEqual(codec.dtype().itemsize, template.Size, template.Name)
+
+    def test_udt_write(self):
+        self.comm.GetTagList()
+        self.comm.UDTResults = True
+        try:
+            value = self.comm.Read('UDTBasic').Value
+            value['b_DINT'] = self.r.Dint()
+            value['b_STRING'] = self.r.String()
+            value['b_BOOL'] = not value['b_BOOL']
+            self.assertEqual(self.comm.Write('UDTBasic', value).Status, 'Success')
+            self.assertEqual(self.comm.Read('UDTBasic').Value, value)
+        finally:
+            self.comm.UDTResults = False
+
+    def test_udt_write_unchanged(self):
+        raw = bytes(self.comm.Read('UDTArray').Value)
+        self.comm.GetTagList()
+        self.comm.UDTResults = True
+        try:
+            value = self.comm.Read('UDTArray').Value
+            self.assertEqual(self.comm.Write('UDTArray', value).Status, 'Success')
+        finally:
+            self.comm.UDTResults = False
+        self.assertEqual(bytes(self.comm.Read('UDTArray').Value), raw)
+
+    def test_coalesced_member_read(self):
+        tags = ['UDTBasic.b_BOOL', 'UDTBasic.b_BITS.31', 'UDTBasic.b_SINT', 'UDTBasic.b_INT',
+                'UDTBasic.b_DINT', 'UDTBasic.b_LINT', 'UDTBasic.b_REAL', 'UDTBasic.b_Timer.PRE']
+        expected = [(r.TagName, r.Value, r.Status) for r in self.comm.Read(tags)]
+        self.comm.GetTagList()
+        self.assertEqual([(r.TagName, r.Value, r.Status) for r in self.comm.Read(tags)], expected)
+
+    def test_array_element_ranges(self):
+        values = self.comm.Read('BaseDINTArray[0]', 32).Value
+        self.assertEqual(self.comm.Read('BaseDINTArray[4:12]').Value, values[4:12])
+        tags = ['BaseDINTArray[{}]'.format(i) for i in (31, 0, 1, 2, 7, 30)]
+        self.assertEqual([r.Value for r in self.comm.Read(tags)], [values[i] for i in (31, 0, 1, 2, 7, 30)])
+
+    def test_array_element_range_invalid(self):
+        with self.assertRaises(ValueError):
+            self.comm.Read('BaseDINTArray[10:5]')
+        with self.assertRaises(ValueError):
+            self.comm.Read(['BaseDINT', 'BaseDINTArray[5:5]'])
+
+    def test_iter_read(self):
+        values = self.comm.Read('BaseDINTArray[0]', 32).Value
+        chunks = list(self.comm.IterRead('BaseDINTArray[0]', 32, 10))
+        self.assertEqual([len(c.Value) for c in chunks], [10, 10, 10, 2])
+        self.assertEqual(sum((c.Value for c in chunks), []), values)
+
+    def test_read_into(self):
+        values = array.array('i', bytes(4 * 32))
+        self.assertEqual(self.comm.ReadInto('BaseDINTArray[0]', values), 'Success')
+        self.assertEqual(list(values), self.comm.Read('BaseDINTArray[0]', 32).Value)
+        tags = ['BaseDINT', 'BaseINT', 'BaseSINT']
+        group = self.comm.CompileRead(tags)
+        buffer = [None] * 3
+        self.assertEqual(self.comm.ReadInto(group, buffer), 'Success')
+        self.assertEqual(buffer, [r.Value for r in self.comm.Read(tags)])
+
+    def test_column_results(self):
+        tags = ['BaseDINT', 'BaseINT', 'BaseSINT', 'BaseDINTArray[3]']
+        responses = self.comm.Read(tags)
+        self.comm.ColumnResults = True
+        try:
+            columns = self.comm.Read(tags)
+        finally:
+            self.comm.ColumnResults = False
+        self.assertEqual(columns.TagNames, tags)
+        self.assertEqual(columns.Values, [r.Value for r in responses])
+        self.assertEqual(columns.Statuses, ['Success'] * 4)
+        self.assertEqual(columns.to_dict()['BaseINT'], responses[1].Value)
+        self.assertEqual(columns[2].Value, responses[2].Value)
+
+    def test_codegen(self):
+        self.comm.GetTagList()
+        types = {}
+        exec(generate(self.comm.UDT, self.comm.TagList), types)
+        self.assertIs(types['TAGS']['UDTBasic'][0], types['UDTS']['Basic'])
+        raw = self.comm.Read('UDTBasic').Value
+        basic = types['UDTS']['Basic'].unpack(raw)
+        self.assertEqual(basic.pack(), bytes(raw))
+        basic.b_DINT = self.r.Dint()
+        self.assertEqual(self.comm.Write('UDTBasic', basic.pack()).Status, 'Success')
+        self.assertEqual(types['UDTS']['Basic'].unpack(self.comm.Read('UDTBasic').Value), basic)
+
+    def test_codegen_string_array(self):
+        self.comm.GetTagList()
+        types = {}
+        exec(generate(self.comm.UDT, self.comm.TagList), types)
+        raw = bytes(self.comm.Read('UDTArray').Value)
+        array = types['TAGS']['UDTArray'][0].unpack(raw)
+        self.assertEqual(array.pack(), raw)
+        expected = self.comm.Read(['UDTArray.b_STRING[{}]'.format(i) for i in range(32)])
+        self.assertEqual(array.b_STRING, [e.Value for e in expected])
+
+    def test_connections(self):
+        tags = ['BaseDINTArray[{}]'.format(i) for i in range(32)] * 20
+        values = [r.Value for r in self.comm.Read(tags)]
+        self.comm.Connections = 3
+        try:
+            self.assertEqual([r.Value for r in self.comm.Read(tags)], values)
+            ret = self.comm.Write([(tag, value) for tag, value in zip(tags[:32], values)])
+            self.assertEqual([r.Status for r in ret], ['Success'] * 32)
+        finally:
+            self.comm.Connections = 1
+
+    @unittest.skipIf(plcConfig.isMicro800, 'for Micro800')
+    def test_gateway(self):
+        tags = ['BaseDINT', 'BaseINT', 'BaseSINT']
+        values = [r.Value for r in self.comm.Read(tags)]
+        with pylogix.Gateway(plcConfig.plc_ip) as gateway:
+            plcs = [gateway.PLC(plcConfig.plc_slot) for i in range(3)]
+            results = gateway.Read(dict((plc, tags) for plc in plcs))
+            for plc in plcs:
+                self.assertEqual([r.Value for r in results[plc]], values)
+
+    def test_shared_between_threads(self):
+        self.comm.Write('BaseDINT', 42)
+
+        def read(i):
+            return self.comm.Read('BaseDINT').Value
+
+        with ThreadPoolExecutor(8) as executor:
+            values = list(executor.map(read, range(32)))
+        self.assertEqual(values, [42] * 32)
+
     def test_micro_800_init(self):
         self.assertFalse(pylogix.PLC().Micro800)
         self.assertFalse(pylogix.PLC(Micro800=False).Micro800)
@@ -0,0 +1,78 @@
+"""
+   Copyright 2022 Dustin Roeder (dmroeder@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Microbenchmark for building request packets, no PLC needed:
+
+python tests/benchmark_packets.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pylogix
+
+
+def setup():
+    """
+    A PLC that looks connected, with the data types of the tags known
+    so nothing needs to be sent
+    """
+    comm = pylogix.PLC('192.168.1.10')
+    comm.conn.SessionHandle = 0x12345678
+    comm.conn.OTNetworkConnectionID = 0x20000002
+    comm.KnownTags['BaseDINT'] = (0xc4, 0)
+    comm.KnownTags['BaseDINTArray'] = (0xc4, 0)
+    comm.KnownTags['Program:MainProgram.Motor'] = (0xa0, 0)
+    return comm
+
+
+def read_request(comm, ioi):
+    request = comm._add_read_service(ioi, 1)
+    return comm.conn._buildFrame(request, True, None)
+
+
+def partial_read_request(comm, ioi):
+    request = comm._add_partial_read_service(ioi, 1000, 4000)
+    return comm.conn._buildFrame(request, True, None)
+
+
+def unconnected_request(comm, ioi):
+    request = comm._add_read_service(ioi, 1)
+    return comm.conn._buildFrame(request, False, 0)
+
+
+def multi_read_request(comm, tags):
+    plan, large = comm._plan_multi_read(tags, False)
+    return [comm.conn._buildFrame(request, True, None) for request, indexes in plan]
+
+
+def main():
+    comm = setup()
+    ioi = comm._build_ioi('BaseDINTArray[10]', 0xc4)
+    tags = ['BaseDINT', 'BaseDINTArray[3]', 'Program:MainProgram.Motor.Speed'] * 10
+    benchmarks = [('read', lambda: read_request(comm, ioi)),
+                  ('partial read', lambda: partial_read_request(comm, ioi)),
+                  ('unconnected read', lambda: unconnected_request(comm, ioi)),
+                  ('multi read (30 tags)', lambda: multi_read_request(comm, tags))]
+
+    for name, func in benchmarks:
+        number = 20000
+        best = min(timeit.repeat(func, number=number, repeat=7))
+        print('{:<24}{:>12,.0f} requests/sec'.format(name, number / best))
+
+
+if __name__ == '__main__':
+    main()